@@ -46,6 +46,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'corsheaders',
     'rest_framework',
     'rest_framework_simplejwt',
@@ -64,6 +65,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'products.carts.CartCookieMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -97,6 +99,61 @@ DATABASES = {
     )
 }
 
+# Cache shared by every gunicorn worker. Catalog caches rely on it for
+# cross-worker invalidation, so production should set REDIS_URL; without it
+# each process gets its own local-memory cache.
+if REDIS_URL := os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Product listing counts: exact counts are cached per filter set for this
+# many seconds; unfiltered listings over the threshold use the planner estimate
+PRODUCT_COUNT_CACHE_TIMEOUT = 60
+PRODUCT_COUNT_ESTIMATE_THRESHOLD = 100000
+# Facet counts are cached per filter set for this many seconds
+PRODUCT_FACETS_CACHE_TIMEOUT = 5 * 60
+
+# Rendered product detail responses are cached for this many seconds
+PRODUCT_DETAIL_CACHE_TIMEOUT = 60 * 60
+# Most product ids one /api/products/batch/ request may ask for
+PRODUCT_BATCH_MAX_IDS = 100
+
+# Where carts of visitors without an account live: 'database' (a session
+# and a Cart row each) or 'cache' (the shared cache, keyed by a signed
+# cookie; needs REDIS_URL with more than one worker). Cache carts become
+# Cart rows when the visitor logs in.
+ANONYMOUS_CART_STORAGE = os.environ.get('ANONYMOUS_CART_STORAGE', 'database')
+ANONYMOUS_CART_TIMEOUT = 30 * 24 * 60 * 60
+# Anonymous database carts untouched for this many days are deleted by
+# the purge_stale_carts command
+ANONYMOUS_CART_MAX_AGE_DAYS = 30
+# Cart item count and total for header badges, cached per cart; cart
+# mutations and product writes invalidate it
+CART_SUMMARY_CACHE_TIMEOUT = 60 * 60
+# Most operations one /api/cart/batch/ request may apply
+CART_BATCH_MAX_OPERATIONS = 100
+
+# Idempotency-Key support on order and payment creation: responses are
+# replayed for this long, and a request that has not finished within the
+# lock timeout (a crashed worker) may be retried
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+IDEMPOTENCY_LOCK_TIMEOUT = 5 * 60
+
+# Cache-Control for catalog responses: browsers always revalidate (cheap
+# 304s via ETag), a CDN may serve a response for CATALOG_CDN_MAX_AGE seconds
+CATALOG_BROWSER_MAX_AGE = 0
+CATALOG_CDN_MAX_AGE = 60
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -142,4 +199,8 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 # Media files
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Render product image variants (products.images) on a background thread
+# after upload; set to False to render inline
+PRODUCT_IMAGE_VARIANTS_ASYNC = True
\ No newline at end of file
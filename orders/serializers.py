@@ -1,15 +1,20 @@
 import logging
 from rest_framework import serializers
-from products.models import Order, OrderItem, Product
+from products.checkout import OrderError, place_order
+from products.inventory import InsufficientStock
+from products.models import Order, OrderItem
 
 logger = logging.getLogger(__name__)
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+    # A plain id: products are looked up for the whole order at once
+    product = serializers.IntegerField(source='product_id')
 
     class Meta:
         model = OrderItem
         fields = ['id', 'product', 'quantity', 'price']
+        # Priced from the catalog when the order is placed
+        read_only_fields = ['price']
 
     def validate_quantity(self, value):
         if value <= 0:
@@ -23,6 +28,7 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ['id', 'user', 'email', 'items', 'shipping_details', 'payment_method', 'total_price', 'status', 'created_at', 'updated_at']
+        read_only_fields = ['total_price']
 
     def validate_items(self, value):
         if not value:
@@ -43,10 +49,12 @@ class OrderSerializer(serializers.ModelSerializer):
         logger.info(f"Creating order with validated data: {validated_data}")
         items_data = validated_data.pop('items')
         try:
-            order = Order.objects.create(**validated_data)
-            for item_data in items_data:
-                OrderItem.objects.create(order=order, **item_data)
-            return order
+            return place_order([(item['product_id'], item['quantity']) for item in items_data], **validated_data)
+        except InsufficientStock:
+            # A conflict, not a validation error: views answer 409 like products' checkout
+            raise
+        except OrderError as e:
+            raise serializers.ValidationError({'items': e.errors})
         except Exception as e:
             logger.error(f"Error creating order: {str(e)}", exc_info=True)
             raise serializers.ValidationError(f"Error creating order: {str(e)}")
\ No newline at end of file
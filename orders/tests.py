@@ -1,3 +1,140 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from products.checkout import place_order
+from products.models import Category, IdempotencyKey, Order, Product
+
+
+class CreateOrderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Apparel')
+        cls.products = [
+            Product.objects.create(name=f'Product {i}', description='', price=Decimal('10.00') + i, category=category, stock=5)
+            for i in range(6)
+        ]
+
+    def create_order(self, products, quantity=1):
+        payload = {
+            'email': 'buyer@example.com',
+            'shipping_details': {'address': '1 Main St'},
+            'payment_method': 'cod',
+            # Client prices are ignored
+            'items': [{'product': product.pk, 'quantity': quantity, 'price': '0.01'} for product in products],
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/create/', payload, content_type='application/json')
+        return response, len(queries)
+
+    def test_query_count_does_not_grow_with_items(self):
+        _, one_line = self.create_order(self.products[:1])
+        response, six_lines = self.create_order(self.products)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(six_lines, one_line)
+
+    def test_items_are_priced_on_the_server(self):
+        response, _ = self.create_order(self.products[:2], quantity=2)
+        body = response.json()
+        self.assertEqual([item['price'] for item in body['items']], ['10.00', '11.00'])
+        self.assertEqual(body['total_price'], '42.00')
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).stock, 3)
+
+    def test_unfillable_order_creates_nothing(self):
+        response, _ = self.create_order(self.products[:2], quantity=6)
+        # Same status and payload as products' checkout
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json(), {
+            'error': 'Not enough stock',
+            'shortages': [{'product': product.pk, 'available': 5} for product in self.products[:2]],
+        })
+        self.assertFalse(Order.objects.exists())
+
+
+class IdempotentCreateOrderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Apparel')
+        cls.product = Product.objects.create(name='Shirt', description='', price=Decimal('10.00'), category=category, stock=5)
+
+    def post(self, key, quantity=1):
+        payload = {
+            'email': 'buyer@example.com',
+            'shipping_details': {'address': '1 Main St'},
+            'payment_method': 'cod',
+            'items': [{'product': self.product.pk, 'quantity': quantity}],
+        }
+        return self.client.post('/api/create/', payload, content_type='application/json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_first_response(self):
+        first = self.post('checkout-1')
+        retry = self.post('checkout-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 4)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.post('checkout-1')
+        response = self.post('checkout-1', quantity=2)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_still_in_progress_conflicts(self):
+        self.post('checkout-1')
+        # As if the first request were still running
+        IdempotencyKey.objects.update(status_code=None, response_body=None, completed_at=None)
+        self.assertEqual(self.post('checkout-1').status_code, 409)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_expired_keys_are_purged(self):
+        self.post('checkout-1')
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL + 1))
+        call_command('purge_idempotency_keys', stdout=StringIO())
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.post('checkout-1').status_code, 201)
+        self.assertEqual(Order.objects.count(), 2)
+
+
+class CancelOrderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Apparel')
+        cls.product = Product.objects.create(name='Shirt', description='', price=Decimal('10.00'), category=category, stock=5)
+        cls.owner = User.objects.create_user('buyer', 'buyer@example.com', 'secret')
+
+    def setUp(self):
+        self.order = place_order([(self.product.pk, 2)], user=self.owner, email=self.owner.email)
+
+    def stock(self):
+        return Product.objects.values_list('stock', flat=True).get(pk=self.product.pk)
+
+    def test_guest_cannot_cancel_by_email(self):
+        for url in (f'/api/{self.order.pk}/cancel/', f'/api/orders/{self.order.pk}/cancel/'):
+            response = self.client.post(url, {'email': self.owner.email}, content_type='application/json')
+            self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.stock(), 3)
+
+    def test_only_owner_or_staff_can_cancel(self):
+        self.client.force_login(User.objects.create_user('other', 'other@example.com', 'secret'))
+        self.assertEqual(self.client.post(f'/api/{self.order.pk}/cancel/').status_code, 404)
+        self.assertEqual(self.client.post(f'/api/orders/{self.order.pk}/cancel/').status_code, 404)
+
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.post(f'/api/orders/{self.order.pk}/cancel/').json()['status'], Order.CANCELLED)
+        self.assertEqual(self.stock(), 5)
 
-# Create your tests here.
+        order = place_order([(self.product.pk, 1)], user=self.owner, email=self.owner.email)
+        self.client.force_login(User.objects.create_user('staff', 'staff@example.com', 'secret', is_staff=True))
+        self.assertEqual(self.client.post(f'/api/{order.pk}/cancel/').json()['status'], Order.CANCELLED)
+        self.assertEqual(self.stock(), 5)
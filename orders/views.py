@@ -2,39 +2,44 @@ from django.core.mail import send_mail
 import logging
 from rest_framework import viewsets
 from django.conf import settings
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from products.models import Order, OrderItem
+from products import inventory
+from products.idempotency import idempotent
+from products.models import Order
 from .serializers import *
 import smtplib
 
 
 
+@idempotent('orders.create')
 @api_view(['POST'])
 def create_order(request):
-    serializer = OrderSerializer(data=request.data)
+    serializer = OrderSerializer(data=request.data, context={'request': request})
     if serializer.is_valid():
-        order = serializer.save()
-        
-        # Create order items
-        items_data = request.data.get('items', [])
-        for item_data in items_data:
-            product = Product.objects.get(id=item_data['product_id'])
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=item_data['quantity'],
-                price=item_data['price']
-            )
-        
-        # Recalculate total price
-        order.total_price = sum(item.price * item.quantity for item in order.items.all())
-        order.save()
-        
+        # Items are created, priced and their stock reserved by the serializer
+        try:
+            order = serializer.save(user=request.user if request.user.is_authenticated else None)
+        except inventory.InsufficientStock as e:
+            return Response(e.as_dict(), status=status.HTTP_409_CONFLICT)
         return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def cancel_order(request, pk):
+    # Restocks the items, so only the order's owner or staff may do it
+    orders = Order.objects.all() if request.user.is_staff else Order.objects.filter(user=request.user)
+    try:
+        order = orders.get(pk=pk)
+    except Order.DoesNotExist:
+        return Response({'error': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
+    if order.status != Order.CANCELLED:
+        inventory.cancel_order(order)
+    return Response(OrderSerializer(order).data)
+
 @api_view(['POST'])
 def notify_seller(request):
     order_id = request.data.get('orderId')
@@ -75,14 +80,25 @@ class OrderViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         
         # If user is authenticated, associate the order with the user
-        if request.user.is_authenticated:
-            serializer.save(user=request.user)
-        else:
-            serializer.save()
+        try:
+            if request.user.is_authenticated:
+                serializer.save(user=request.user)
+            else:
+                serializer.save()
+        except inventory.InsufficientStock as e:
+            return Response(e.as_dict(), status=status.HTTP_409_CONFLICT)
 
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
+    def perform_update(self, serializer):
+        order = serializer.save()
+        if order.status == Order.CANCELLED:
+            inventory.release_order(order)
+
+    def perform_destroy(self, instance):
+        inventory.delete_order(instance)
+
     def get_queryset(self):
         if self.request.user.is_authenticated:
             return Order.objects.filter(user=self.request.user)
@@ -1,3 +1,37 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.test import Client, TestCase
+
+from products.models import IdempotencyKey
+
+
+class InitiatePaymentTests(TestCase):
+    def paystack_reply(self, status_code, body=None):
+        return mock.Mock(status_code=status_code, json=mock.Mock(return_value=body or {}))
+
+    def initiate(self, key, email='buyer@example.com', client=None):
+        return (client or self.client).post(
+            '/payments/initiate/', {'email': email, 'amount': '25.00'},
+            content_type='application/json', HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    @mock.patch('payments.views.requests.post')
+    def test_gateway_failure_is_not_replayed(self, post):
+        post.return_value = self.paystack_reply(503)
+        self.assertEqual(self.initiate('pay-1').status_code, 502)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        post.return_value = self.paystack_reply(200, {'status': True, 'data': {'reference': 'ref-1'}})
+        self.assertEqual(self.initiate('pay-1').json()['data']['reference'], 'ref-1')
+        replayed = self.initiate('pay-1')
+        self.assertEqual(replayed['Idempotent-Replayed'], 'true')
+        self.assertEqual(replayed.json()['data']['reference'], 'ref-1')
+        self.assertEqual(post.call_count, 2)
+
+    @mock.patch('payments.views.requests.post')
+    def test_guests_reusing_a_key_do_not_collide(self, post):
+        post.return_value = self.paystack_reply(200, {'status': True})
+        first = self.initiate('pay-1', client=Client(REMOTE_ADDR='10.0.0.1'))
+        second = self.initiate('pay-1', email='other@example.com', client=Client(REMOTE_ADDR='10.0.0.2'))
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertEqual(post.call_count, 2)
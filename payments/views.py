@@ -5,11 +5,14 @@ from django.views.decorators.csrf import csrf_exempt
 import json
 import requests
 
+from products.idempotency import idempotent
+
 PAYSTACK_SECRET_KEY = settings.PAYSTACK_SECRET_KEY
 PAYSTACK_INITIALIZE_URL = "https://api.paystack.co/transaction/initialize"
 PAYSTACK_VERIFY_URL = "https://api.paystack.co/transaction/verify/"
 
 @csrf_exempt
+@idempotent('payments.initiate')
 def initiate_payment(request):
     if request.method == "POST":
         try:
@@ -30,9 +33,14 @@ def initiate_payment(request):
             
             if response.status_code == 200:
                 return JsonResponse(response.json())
+            if response.status_code >= 500 or response.status_code == 429:
+                # A gateway hiccup, not a bad request: a 5xx is never replayed, so the client can retry
+                return JsonResponse({'error': 'Payment gateway unavailable'}, status=502)
             return JsonResponse({'error': 'Failed to initiate payment'}, status=400)
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        except requests.RequestException:
+            return JsonResponse({'error': 'Payment gateway unavailable'}, status=502)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
 
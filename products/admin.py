@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Category, Product, Order, OrderItem, Cart, CartItem
+from . import inventory
+from .models import Category, Product, Order, OrderItem, Cart, CartItem, ProductAssociation
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -23,6 +24,18 @@ class OrderAdmin(admin.ModelAdmin):
     search_fields = ['user__username', 'user__email']
     inlines = [OrderItemInline]
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if obj.status == Order.CANCELLED:
+            inventory.release_order(obj)
+
+    def delete_model(self, request, obj):
+        inventory.delete_order(obj)
+
+    def delete_queryset(self, request, queryset):
+        for order in queryset:
+            inventory.delete_order(order)
+
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ['order', 'product', 'quantity', 'price']
@@ -37,11 +50,31 @@ class CartItemInline(admin.TabularInline):
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'session_id', 'created_at', 'item_count', 'total']
+    list_select_related = ['user']
     inlines = [CartItemInline]
     search_fields = ['user__email', 'session_id']
 
+    def get_queryset(self, request):
+        # Totals are summed by the database for the whole page at once
+        return super().get_queryset(request).with_totals()
+
+    @admin.display(description='Item count', ordering='annotated_item_count')
+    def item_count(self, obj):
+        return obj.annotated_item_count
+
+    @admin.display(description='Total', ordering='annotated_total')
+    def total(self, obj):
+        return obj.annotated_total
+
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
     list_display = ['id', 'cart', 'product', 'quantity', 'subtotal']
+    list_select_related = ['cart__user', 'product']
     list_filter = ['cart']
-    search_fields = ['product__name']
\ No newline at end of file
+    search_fields = ['product__name']
+
+@admin.register(ProductAssociation)
+class ProductAssociationAdmin(admin.ModelAdmin):
+    list_display = ['product', 'related', 'count']
+    search_fields = ['product__name', 'related__name']
+    raw_id_fields = ['product', 'related']
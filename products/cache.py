@@ -0,0 +1,92 @@
+"""
+Version stamps for cached catalog data.
+
+Cache keys embed a version that signal handlers bump on writes, so every
+worker sharing the cache stops reading stale entries at once and nothing
+has to enumerate keys to invalidate them.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = 'products:catalog-version'
+CATEGORY_VERSION_KEY = 'products:category-version'
+
+# Bump whenever ProductSerializer's output changes shape, so entries
+# rendered by the previous code are never served.
+PRODUCT_DETAIL_SCHEMA_VERSION = 2
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(key):
+    # A fresh timestamp rather than incr(): a version evicted from the cache
+    # must never come back with a value older entries were stored under.
+    cache.set(key, time.time_ns(), timeout=None)
+
+
+def get_catalog_version():
+    """Version of the product table, bumped on every product write."""
+    return _get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    _bump_version(CATALOG_VERSION_KEY)
+
+
+def get_category_version():
+    """Version of the category tree, bumped on every category write."""
+    return _get_version(CATEGORY_VERSION_KEY)
+
+
+def bump_category_version():
+    _bump_version(CATEGORY_VERSION_KEY)
+
+
+def product_detail_keys(pks, category_version=None):
+    """
+    Cache keys of rendered product details. The category version is part
+    of the key because the representation embeds the category subtree.
+    """
+    if category_version is None:
+        category_version = get_category_version()
+    prefix = f'products:detail:v{PRODUCT_DETAIL_SCHEMA_VERSION}:{category_version}'
+    return {pk: f'{prefix}:{pk}' for pk in pks}
+
+
+def get_product_detail(pk):
+    """``(data, updated_at)`` of a cached product detail, or ``None``."""
+    return cache.get(product_detail_keys([pk])[pk])
+
+
+def set_product_detail(pk, data, updated_at):
+    cache.set(product_detail_keys([pk])[pk], (data, updated_at), settings.PRODUCT_DETAIL_CACHE_TIMEOUT)
+
+
+def get_product_details(pks):
+    """Cached ``(data, updated_at)`` of each of ``pks`` that has one, in a single round trip."""
+    keys = product_detail_keys(pks)
+    found = cache.get_many(list(keys.values()))
+    return {pk: found[key] for pk, key in keys.items() if key in found}
+
+
+def set_product_details(entries):
+    """Store ``{pk: (data, updated_at)}`` in a single round trip."""
+    keys = product_detail_keys(entries)
+    cache.set_many({keys[pk]: entry for pk, entry in entries.items()}, settings.PRODUCT_DETAIL_CACHE_TIMEOUT)
+
+
+def invalidate_product_details(pks):
+    """
+    Drop cached details of ``pks``. Signals cover ``save()``/``delete()``;
+    code that writes products with ``queryset.update()`` or bulk methods
+    must call this itself.
+    """
+    cache.delete_many(list(product_detail_keys(pks).values()))
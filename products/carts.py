@@ -0,0 +1,372 @@
+"""
+Cart lookup for the cart endpoints, including cache-backed anonymous carts.
+
+With ``ANONYMOUS_CART_STORAGE = 'cache'`` a visitor without an account
+gets no session row and no ``Cart`` row: their cart is a small
+``{product_id: quantity}`` dict in the shared cache, keyed by a random
+token in a signed cookie. Viewing it writes nothing, and even adding to it
+only writes to the cache. The first authenticated request or session
+login afterwards merges it into the user's ``Cart`` with one read and two
+bulk writes.
+
+Batched mutations (``apply_operations``) work on either kind of cart.
+"""
+import secrets
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .cache import get_catalog_version
+from .inventory import InsufficientStock
+from .models import Cart, CartItem, Product
+
+CART_COOKIE = 'cart_token'
+COOKIE_SALT = 'products.carts'
+
+
+def anonymous_carts_in_cache():
+    return settings.ANONYMOUS_CART_STORAGE == 'cache'
+
+
+def _cache_key(token):
+    return f'carts:anonymous:{token}'
+
+
+def _request_token(request):
+    return request.get_signed_cookie(CART_COOKIE, default=None, salt=COOKIE_SALT)
+
+
+def _summary_key(owner):
+    # Under the catalog version: a price change alters every total
+    return f'carts:summary:{get_catalog_version()}:{owner}'
+
+
+def invalidate_cart_summary(cart_id):
+    """Drop the cached summary of a database cart once the current transaction commits."""
+    transaction.on_commit(lambda: cache.delete(_summary_key(cart_id)))
+
+
+class AnonymousCart:
+    """
+    Cache-held cart serializable by ``CartSerializer``. Item ids are the
+    product ids, since the items have no rows of their own.
+    """
+    id = None
+
+    def __init__(self, token=None, lines=None):
+        self.token = token
+        self.lines = dict(lines or {})
+
+    @classmethod
+    def from_request(cls, request):
+        token = _request_token(request)
+        lines = cache.get(_cache_key(token)) if token else None
+        return cls(token if lines is not None else None, lines)
+
+    @cached_property
+    def items(self):
+        products = Product.objects.for_api().in_bulk(list(self.lines))
+        return [
+            CartItem(id=product_id, product=products[product_id], quantity=quantity)
+            for product_id, quantity in self.lines.items()
+            if product_id in products
+        ]
+
+    def load_items(self):
+        self.__dict__.pop('items', None)
+        return self
+
+    @property
+    def total(self):
+        return sum((item.subtotal for item in self.items), Decimal('0.00'))
+
+    @property
+    def item_count(self):
+        return sum(item.quantity for item in self.items)
+
+    def add(self, product_id, quantity):
+        self.lines[product_id] = self.lines.get(product_id, 0) + quantity
+        self.load_items()
+
+    def set_quantity(self, product_id, quantity):
+        """Set or, for ``quantity <= 0``, remove a line; returns whether it was in the cart."""
+        if product_id not in self.lines:
+            return False
+        if quantity > 0:
+            self.lines[product_id] = quantity
+        else:
+            del self.lines[product_id]
+        self.load_items()
+        return True
+
+    def save(self, response):
+        """Store the cart and (re)issue its cookie on ``response``; returns the response."""
+        if self.token is None:
+            self.token = secrets.token_urlsafe(24)
+        cache.set(_cache_key(self.token), self.lines, settings.ANONYMOUS_CART_TIMEOUT)
+        cache.delete(_summary_key(f'anonymous:{self.token}'))
+        response.set_signed_cookie(
+            CART_COOKIE, self.token, salt=COOKIE_SALT, max_age=settings.ANONYMOUS_CART_TIMEOUT,
+            httponly=True, samesite='Lax', secure=settings.SESSION_COOKIE_SECURE,
+        )
+        return response
+
+
+def merge_anonymous_cart(request, cart):
+    """
+    Fold the requester's cache cart into ``cart``; returns whether there was
+    one. The cookie is spent either way, so ``CartCookieMiddleware`` deletes
+    it from the response and later requests skip the lookup.
+    """
+    if CART_COOKIE not in request.COOKIES:
+        return False
+    # DRF wraps the HttpRequest the middleware sees
+    getattr(request, '_request', request).clear_cart_cookie = True
+    token = _request_token(request)
+    if not token:
+        return False
+    key = _cache_key(token)
+    lines = cache.get(key)
+    # Only the request that actually deletes the entry merges it
+    if not lines or not cache.delete(key):
+        return False
+
+    now = timezone.now()
+    with transaction.atomic():
+        existing = {item.product_id: item for item in CartItem.objects.filter(cart=cart, product_id__in=list(lines))}
+        to_update, to_create = [], []
+        for product_id in Product.objects.filter(pk__in=list(lines)).values_list('id', flat=True):
+            item = existing.get(product_id)
+            if item is None:
+                to_create.append(CartItem(cart=cart, product_id=product_id, quantity=lines[product_id]))
+            else:
+                item.quantity += lines[product_id]
+                item.updated_at = now  # bulk_update skips auto_now
+                to_update.append(item)
+        CartItem.objects.bulk_update(to_update, ['quantity', 'updated_at'])
+        CartItem.objects.bulk_create(to_create)
+        invalidate_cart_summary(cart.pk)
+    return True
+
+
+# Backends that understand INSERT ... ON CONFLICT ... DO UPDATE
+ON_CONFLICT_VENDORS = ('postgresql', 'sqlite')
+
+
+class CartCookieMiddleware:
+    """Delete the anonymous cart cookie once its cart has been merged into a user's."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if getattr(request, 'clear_cart_cookie', False):
+            response.delete_cookie(CART_COOKIE, samesite='Lax')
+        return response
+
+
+def _upsert_cart_item(cart, product_id, quantity):
+    """
+    Add ``quantity`` to the cart line in one statement: insert it, or on
+    the (cart, product) unique key add to it, either way only while the
+    line's new quantity is in stock. Concurrent adds serialize on the row
+    instead of racing on the constraint. Returns whether a row was written.
+    Backends without ``ON CONFLICT`` take the locking fallback.
+    """
+    if connection.vendor not in ON_CONFLICT_VENDORS:
+        return _add_to_cart_item(cart, product_id, quantity)
+    item, product = CartItem._meta, Product._meta
+    quote = connection.ops.quote_name
+    table, products_table = quote(item.db_table), quote(product.db_table)
+    cart_col, product_col, quantity_col, created_col, updated_col = (
+        quote(item.get_field(name).column) for name in ('cart', 'product', 'quantity', 'created_at', 'updated_at')
+    )
+    id_col, stock_col = quote(product.pk.column), quote(product.get_field('stock').column)
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({cart_col}, {product_col}, {quantity_col}, {created_col}, {updated_col}) "
+            f"SELECT %s, {id_col}, %s, %s, %s FROM {products_table} WHERE {id_col} = %s AND {stock_col} >= %s "
+            f"ON CONFLICT ({cart_col}, {product_col}) DO UPDATE SET "
+            f"{quantity_col} = {table}.{quantity_col} + EXCLUDED.{quantity_col}, {updated_col} = EXCLUDED.{updated_col} "
+            f"WHERE {table}.{quantity_col} + EXCLUDED.{quantity_col} <= "
+            f"(SELECT {stock_col} FROM {products_table} WHERE {id_col} = EXCLUDED.{product_col})",
+            [cart.pk, quantity, now, now, product_id, quantity],
+        )
+        return cursor.rowcount > 0
+
+
+def _add_to_cart_item(cart, product_id, quantity):
+    """``_upsert_cart_item`` for other backends: lock the product row, then insert or add to the line."""
+    with transaction.atomic():
+        # Concurrent adds of the product queue here, so the line cannot be inserted twice
+        stock = Product.objects.select_for_update().filter(pk=product_id).values_list('stock', flat=True).first()
+        if stock is None:
+            return False
+        item = CartItem.objects.filter(cart=cart, product_id=product_id).values_list('pk', 'quantity').first()
+        if (item[1] if item else 0) + quantity > stock:
+            return False
+        if item is None:
+            CartItem.objects.create(cart=cart, product_id=product_id, quantity=quantity)
+        else:
+            CartItem.objects.filter(pk=item[0]).update(quantity=F('quantity') + quantity, updated_at=timezone.now())
+    return True
+
+
+def add_item(cart, product_id, quantity):
+    """
+    Add ``quantity`` of a product to ``cart``, keeping the line within
+    stock. Raises ``Product.DoesNotExist`` or ``InsufficientStock``.
+    """
+    if isinstance(cart, AnonymousCart):
+        stock = Product.objects.values_list('stock', flat=True).get(pk=product_id)
+        if cart.lines.get(product_id, 0) + quantity > stock:
+            raise InsufficientStock({product_id: stock})
+        cart.add(product_id, quantity)
+        return cart
+    if not _upsert_cart_item(cart, product_id, quantity):
+        # Nothing written: find out why, off the fast path
+        stock = Product.objects.values_list('stock', flat=True).get(pk=product_id)
+        raise InsufficientStock({product_id: stock})
+    invalidate_cart_summary(cart.pk)
+    return cart
+
+
+class CartOperationError(ValueError):
+    def __init__(self, errors):
+        # [{'index': position in the batch, 'error': message}]
+        self.errors = errors
+        super().__init__("; ".join(error['error'] for error in errors))
+
+
+def plan_operations(current, operations, stock):
+    """
+    Final ``{product_id: quantity}`` after applying ``operations`` in order
+    to ``current``. ``stock`` maps every existing product to its stock;
+    raises ``CartOperationError`` listing every operation that cannot apply.
+    """
+    lines = dict(current)
+    errors = []
+    for index, operation in enumerate(operations):
+        product_id, quantity = operation['product_id'], operation['quantity']
+        if product_id not in stock:
+            errors.append({'index': index, 'error': f"Product {product_id} not found"})
+            continue
+        if operation['op'] == 'remove' or (operation['op'] == 'set' and quantity == 0):
+            lines.pop(product_id, None)
+            continue
+        lines[product_id] = quantity + (lines.get(product_id, 0) if operation['op'] == 'add' else 0)
+        if lines[product_id] > stock[product_id]:
+            errors.append({'index': index, 'error': f"Not enough stock for product {product_id}"})
+    if errors:
+        raise CartOperationError(errors)
+    return lines
+
+
+def apply_operations(cart, operations):
+    """
+    Apply validated add/set/remove ``operations`` to ``cart`` all or
+    nothing: one product query, one items query and bulk writes in a
+    single transaction. Returns the cart with its items reloaded.
+    """
+    product_ids = {operation['product_id'] for operation in operations}
+    stock = dict(Product.objects.filter(pk__in=product_ids).values_list('id', 'stock'))
+
+    if isinstance(cart, AnonymousCart):
+        cart.lines = plan_operations(cart.lines, operations, stock)
+        return cart.load_items()
+
+    with transaction.atomic():
+        existing = {
+            item.product_id: item
+            for item in CartItem.objects.select_for_update().filter(cart=cart, product_id__in=product_ids)
+        }
+        lines = plan_operations({pk: item.quantity for pk, item in existing.items()}, operations, stock)
+
+        now = timezone.now()
+        to_create, to_update = [], []
+        for product_id in product_ids:
+            item, quantity = existing.get(product_id), lines.get(product_id)
+            if quantity is None or item is not None and item.quantity == quantity:
+                continue
+            if item is None:
+                to_create.append(CartItem(cart=cart, product_id=product_id, quantity=quantity))
+            else:
+                item.quantity = quantity
+                item.updated_at = now  # bulk_update skips auto_now
+                to_update.append(item)
+        removed = [item.pk for product_id, item in existing.items() if product_id not in lines]
+        if removed:
+            CartItem.objects.filter(pk__in=removed).delete()
+        CartItem.objects.bulk_update(to_update, ['quantity', 'updated_at'])
+        CartItem.objects.bulk_create(to_create)
+        invalidate_cart_summary(cart.pk)
+    return cart.load_items()
+
+
+def get_cart(request):
+    """
+    The requester's cart: a ``Cart`` row for users and, in database mode,
+    for anonymous visitors; an ``AnonymousCart`` otherwise.
+    """
+    if request.user.is_authenticated:
+        cart, _ = Cart.objects.get_or_create(user=request.user)
+        merge_anonymous_cart(request, cart)
+        return cart
+    if anonymous_carts_in_cache():
+        return AnonymousCart.from_request(request)
+    session_id = request.session.session_key
+    if not session_id:
+        request.session.create()
+        session_id = request.session.session_key
+    cart, _ = Cart.objects.get_or_create(session_id=session_id)
+    return cart
+
+
+def _summary(cart):
+    if isinstance(cart, AnonymousCart):
+        prices = dict(Product.objects.filter(pk__in=list(cart.lines)).values_list('id', 'price'))
+        lines = [(prices[pk], quantity) for pk, quantity in cart.lines.items() if pk in prices]
+        return {
+            'item_count': sum(quantity for _, quantity in lines),
+            'total': sum((price * quantity for price, quantity in lines), Decimal('0.00')),
+        }
+    return CartItem.objects.filter(cart=cart).aggregate(
+        item_count=Coalesce(Sum('quantity'), Value(0)),
+        total=Coalesce(
+            Sum(F('quantity') * F('product__price'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+            Value(Decimal('0.00')),
+        ),
+    )
+
+
+def cart_summary(cart):
+    """``{'item_count', 'total'}`` of ``cart`` (``None`` for no cart) from the cache or one query."""
+    owner = None
+    if isinstance(cart, AnonymousCart):
+        owner = cart.token and f'anonymous:{cart.token}'
+    elif cart is not None:
+        owner = cart.pk
+    if owner is None:
+        return {'item_count': 0, 'total': Decimal('0.00')}
+    key = _summary_key(owner)
+    summary = cache.get(key)
+    if summary is None:
+        summary = _summary(cart)
+        cache.set(key, summary, settings.CART_SUMMARY_CACHE_TIMEOUT)
+    return summary
+
+
+def get_cart_summary(request):
+    """Summary of the requester's cart, without creating a session or cart for it."""
+    if request.user.is_authenticated or anonymous_carts_in_cache():
+        return cart_summary(get_cart(request))
+    session_id = request.session.session_key
+    return cart_summary(Cart.objects.filter(session_id=session_id).first() if session_id else None)
@@ -0,0 +1,55 @@
+"""
+Per-worker cache of the whole category forest.
+
+Each process keeps one immutable ``CategoryTree`` snapshot with every
+category's serialized representation precomputed. Serving it costs one
+read of the category version stamp from the shared cache; category
+signals bump that stamp, and the next request in every worker rebuilds
+its snapshot from a single query.
+"""
+import threading
+
+from .cache import get_category_version
+from .models import Category
+
+_tree = None
+_lock = threading.Lock()
+
+
+class CategoryTree:
+    def __init__(self, version, categories):
+        # Imported here: serializers import this module for the product category field
+        from .serializers import CategorySerializer
+
+        self.version = version
+        self.categories = sorted(categories, key=lambda category: category.pk)
+        self.by_id = {category.pk: category for category in self.categories}
+        self.children = Category.children_map(self.categories)
+        context = {'category_children': self.children}
+        self.representations = {
+            category.pk: CategorySerializer(category, context=context).data
+            for category in self.categories
+        }
+
+    def get(self, pk):
+        """Serialized category, or ``None`` if it does not exist."""
+        return self.representations.get(pk)
+
+    def list(self, parent_id=None):
+        categories = self.categories
+        if parent_id is not None:
+            categories = self.children.get(parent_id, [])
+        return [self.representations[category.pk] for category in categories]
+
+
+def get_category_tree():
+    """Current snapshot, rebuilt if another worker changed a category."""
+    global _tree
+    version = get_category_version()
+    tree = _tree
+    if tree is None or tree.version != version:
+        with _lock:
+            if _tree is None or _tree.version != version:
+                _tree = CategoryTree(version, Category.objects.all())
+            tree = _tree
+    return tree
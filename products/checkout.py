@@ -0,0 +1,72 @@
+"""
+Order creation shared by every checkout endpoint.
+
+An order costs the same handful of queries however many lines it has:
+one ``in_bulk`` for the products, one insert for the order, one
+``bulk_create`` for its items and one statement reserving their stock,
+all in a single transaction. Items are priced from the catalog; prices
+and totals sent by the client are ignored.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+
+from .inventory import reserve_stock
+from .models import Order, OrderItem, Product
+
+
+class OrderError(ValueError):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(errors))
+
+
+def clean_lines(items):
+    """
+    ``[(product_id, quantity)]`` from request item dicts keyed ``product_id``
+    (or ``product``) and ``quantity``. Raises ``OrderError``.
+    """
+    if not items or not isinstance(items, list):
+        raise OrderError(["At least one item is required."])
+    lines, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            product_id = int(item.get('product_id', item.get('product')))
+            quantity = int(item.get('quantity', 1))
+        except (AttributeError, TypeError, ValueError):
+            errors.append(f"Item {index}: product_id and quantity must be integers.")
+            continue
+        if quantity <= 0:
+            errors.append(f"Item {index}: quantity must be greater than zero.")
+            continue
+        lines.append((product_id, quantity))
+    if errors:
+        raise OrderError(errors)
+    return lines
+
+
+def place_order(lines, **fields):
+    """
+    Create an order for ``(product_id, quantity)`` lines with its stock
+    reserved. ``fields`` are the remaining Order fields (user, email,
+    shipping_details, ...). Raises ``OrderError`` for unknown products and
+    ``InsufficientStock`` when a line cannot be filled.
+    """
+    products = Product.objects.only('id', 'price').in_bulk({product_id for product_id, _ in lines})
+    if missing := sorted({product_id for product_id, _ in lines} - set(products)):
+        raise OrderError([f"Product {product_id} not found." for product_id in missing])
+
+    items = [
+        OrderItem(product_id=product_id, quantity=quantity, price=products[product_id].price)
+        for product_id, quantity in lines
+    ]
+    fields['total_price'] = sum((item.price * item.quantity for item in items), Decimal('0.00'))
+    with transaction.atomic():
+        # Marked reserved up front: if the reservation fails, nothing commits
+        order = Order.objects.create(stock_reserved=True, **fields)
+        for item in items:
+            item.order = order
+        OrderItem.objects.bulk_create(items)
+        # Last, so product rows stay locked only until the commit
+        reserve_stock(lines)
+    return order
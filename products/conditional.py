@@ -0,0 +1,99 @@
+"""
+Conditional GET for catalog endpoints.
+
+Views work out a validator (ETag, Last-Modified) from cheap data before
+serializing anything. When the client's ``If-None-Match`` or
+``If-Modified-Since`` still matches, a 304 goes back and the serializer
+never runs. Successful responses also get ``Cache-Control`` headers a CDN
+in front of the API can honour.
+"""
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers, quote_etag
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .cache import get_catalog_version, get_category_version, get_product_detail, set_product_detail
+from .filters import int_or_none
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.sha1(repr(parts).encode()).hexdigest())
+
+
+def not_modified(request, etag=None, last_modified=None):
+    """A 304 response if the client's copy is still current, otherwise ``None``."""
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag=None, last_modified=None):
+    if etag:
+        response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Browsers revalidate every time (a cheap 304); shared caches may reuse
+    # the response for CATALOG_CDN_MAX_AGE seconds.
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=settings.CATALOG_BROWSER_MAX_AGE,
+        s_maxage=settings.CATALOG_CDN_MAX_AGE,
+    )
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def category_etag(request):
+    """Category responses change only when the category tree version does."""
+    return make_etag('categories', request.get_full_path(), get_category_version(), request.accepted_renderer.format)
+
+
+class ConditionalProductListMixin:
+    """
+    Answer product list requests with 304 when nothing they show has
+    changed, judged by the catalog and category tree versions and the full
+    query string. The catalog version is bumped on every product write, so
+    revalidating costs no queries and never counts the filtered rows.
+    """
+
+    def list(self, request, *args, **kwargs):
+        etag = make_etag(
+            'products', request.get_full_path(), get_catalog_version(),
+            get_category_version(), request.accepted_renderer.format,
+        )
+        if (response := not_modified(request, etag)) is not None:
+            return response
+        return set_validators(super().list(request, *args, **kwargs), etag)
+
+
+class CachedProductDetailMixin:
+    """
+    Product detail served read-through from the rendered-detail cache and
+    validated by ``updated_at`` and the category tree version. A cache hit
+    never touches the ORM. Only the full representation is cached; field
+    selections are rendered directly.
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = int_or_none(kwargs.get(self.lookup_url_kwarg or self.lookup_field))
+        cacheable = pk is not None and not self.get_field_selection()
+        cached = get_product_detail(pk) if cacheable else None
+        if cached is not None:
+            data, updated_at = cached
+        else:
+            instance = self.get_object()
+            data, updated_at = None, instance.updated_at
+
+        etag = make_etag('product', pk, updated_at, get_category_version(), request.accepted_renderer.format)
+        if (response := not_modified(request, etag, updated_at)) is not None:
+            return response
+        if data is None:
+            data = self.get_serializer(instance).data
+            if cacheable:
+                set_product_detail(instance.pk, data, updated_at)
+        return set_validators(Response(data), etag, updated_at)
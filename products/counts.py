@@ -0,0 +1,93 @@
+"""
+Count strategies for paginated product listings.
+
+Exact counts are cached per normalized filter set under the catalog and
+category versions, so any product or category write invalidates them.
+Large unfiltered listings, or clients that ask with ``?count=estimate``,
+get the PostgreSQL planner's row estimate instead of a ``COUNT(*)``.
+"""
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.functional import cached_property
+
+from .cache import get_catalog_version, get_category_version
+
+logger = logging.getLogger(__name__)
+
+
+def count_cache_key(filters):
+    digest = hashlib.sha1(json.dumps(filters, sort_keys=True).encode()).hexdigest()
+    # Subcategory filters follow category paths, so a re-parent changes counts too
+    return f'products:count:{get_catalog_version()}:{get_category_version()}:{digest}'
+
+
+def table_estimate(model):
+    """Row estimate for the whole table from ``pg_class.reltuples``."""
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    # reltuples is -1 for a table that has never been analyzed
+    if row is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+def planner_estimate(queryset):
+    """Row estimate for ``queryset`` from ``EXPLAIN`` without executing it."""
+    if connection.vendor != 'postgresql':
+        return None
+    try:
+        plan = json.loads(queryset.explain(format='json'))
+        return int(plan[0]['Plan']['Plan Rows'])
+    except (ValueError, KeyError, IndexError, TypeError):
+        logger.warning("Could not read planner estimate", exc_info=True)
+        return None
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator whose ``count`` comes from the cache or the planner when possible."""
+
+    def __init__(self, object_list, per_page, filters=None, estimate=False, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.filters = filters or {}
+        self.estimate = estimate
+        self.count_exact = True
+
+    @cached_property
+    def count(self):
+        if self.estimate and (estimate := self.get_estimate()) is not None:
+            self.count_exact = False
+            return estimate
+
+        key = count_cache_key(self.filters)
+        count = cache.get(key)
+        if count is not None:
+            return count
+
+        # Counting a big unfiltered catalog is a full scan; the estimate is
+        # close enough for "about N products" there.
+        if not self.filters:
+            estimate = table_estimate(self.object_list.model)
+            if estimate is not None and estimate >= settings.PRODUCT_COUNT_ESTIMATE_THRESHOLD:
+                self.count_exact = False
+                return estimate
+
+        count = super().count
+        cache.set(key, count, settings.PRODUCT_COUNT_CACHE_TIMEOUT)
+        return count
+
+    def get_estimate(self):
+        if self.filters:
+            return planner_estimate(self.object_list)
+        return table_estimate(self.object_list.model)
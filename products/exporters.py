@@ -0,0 +1,117 @@
+"""
+Streaming CSV / NDJSON exports of products, orders and order items.
+
+Rows are read with ``iterator(chunk_size=...)`` (a server-side cursor on
+PostgreSQL) as plain value tuples and encoded into fixed-size chunks as
+they arrive, optionally gzip-compressed on the fly, so memory stays flat
+no matter how many rows are exported.
+"""
+import csv
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .category_tree import get_category_tree
+from .models import Order, OrderItem, Product
+
+OUTPUTS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+CHUNK_SIZE = 2000
+# Encoded rows are buffered up to roughly this many bytes per write
+BUFFER_SIZE = 64 * 1024
+
+
+def product_rows(chunk_size):
+    tree = get_category_tree()
+    rows = Product.objects.order_by('id').values_list(
+        'id', 'sku', 'name', 'description', 'price', 'stock', 'category_id',
+        'image', 'created_at', 'updated_at',
+    ).iterator(chunk_size=chunk_size)
+    for row in rows:
+        category = tree.by_id.get(row[6])
+        yield row[:7] + (category.name if category else None,) + row[7:]
+
+
+def order_rows(chunk_size):
+    return Order.objects.order_by('id').values_list(
+        'id', 'user_id', 'email', 'status', 'total_price', 'payment_method',
+        'shipping_details', 'created_at', 'updated_at',
+    ).iterator(chunk_size=chunk_size)
+
+
+def order_item_rows(chunk_size):
+    return OrderItem.objects.order_by('id').values_list(
+        'id', 'order_id', 'product_id', 'quantity', 'price',
+    ).iterator(chunk_size=chunk_size)
+
+
+# dataset name -> (column names, row generator)
+DATASETS = {
+    'products': (
+        ['id', 'sku', 'name', 'description', 'price', 'stock', 'category_id', 'category',
+         'image', 'created_at', 'updated_at'],
+        product_rows,
+    ),
+    'orders': (
+        ['id', 'user_id', 'email', 'status', 'total_price', 'payment_method',
+         'shipping_details', 'created_at', 'updated_at'],
+        order_rows,
+    ),
+    'order-items': (
+        ['id', 'order_id', 'product_id', 'quantity', 'price'],
+        order_item_rows,
+    ),
+}
+
+
+class _Echo:
+    """File-like object whose ``write`` hands the line back to ``csv.writer``."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(
+            json.dumps(value, cls=DjangoJSONEncoder) if isinstance(value, (dict, list)) else value
+            for value in row
+        )
+
+
+def _ndjson_lines(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def export_chunks(dataset, output='csv', compress=False, chunk_size=CHUNK_SIZE):
+    """Yield the encoded export of ``dataset`` as ``bytes`` chunks."""
+    columns, row_source = DATASETS[dataset]
+    lines = (_csv_lines if output == 'csv' else _ndjson_lines)(columns, row_source(chunk_size))
+    compressor = zlib.compressobj(wbits=31) if compress else None  # 31: gzip container
+
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE:
+            data = ''.join(buffer).encode()
+            buffer, size = [], 0
+            if compressor:
+                data = compressor.compress(data)
+            if data:
+                yield data
+    data = ''.join(buffer).encode()
+    if compressor:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+def export_filename(dataset, output, compress):
+    return f"{dataset}.{output}" + ('.gz' if compress else '')
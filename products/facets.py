@@ -0,0 +1,96 @@
+"""
+Facet counts for the storefront filter sidebar.
+
+Every facet for the current filter set comes out of one grouped query:
+rows are grouped by category and each price bucket and the in-stock flag
+is a conditional ``COUNT``. Per-category rows are then summed in Python.
+Results are cached per normalized filter set under the catalog and
+category versions, so product or category writes invalidate them.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .cache import get_catalog_version, get_category_version
+from .category_tree import get_category_tree
+
+# Price bucket key -> (lower bound inclusive, upper bound exclusive); None is open
+PRICE_BUCKETS = {
+    '0-25': (None, 25),
+    '25-50': (25, 50),
+    '50-100': (50, 100),
+    '100-250': (100, 250),
+    '250+': (250, None),
+}
+
+
+def facets_cache_key(filters):
+    digest = hashlib.sha1(json.dumps(filters, sort_keys=True).encode()).hexdigest()
+    return f'products:facets:{get_catalog_version()}:{get_category_version()}:{digest}'
+
+
+def _price_filter(lower, upper):
+    condition = Q()
+    if lower is not None:
+        condition &= Q(price__gte=lower)
+    if upper is not None:
+        condition &= Q(price__lt=upper)
+    return condition
+
+
+def compute_facets(queryset):
+    """Category, price bucket and in-stock counts of ``queryset`` from a single query."""
+    buckets = {f'price_{i}': key for i, key in enumerate(PRICE_BUCKETS)}
+    rows = queryset.order_by().values('category_id').annotate(
+        count=Count('id'),
+        in_stock=Count('id', filter=Q(stock__gt=0)),
+        **{
+            alias: Count('id', filter=_price_filter(*PRICE_BUCKETS[key]))
+            for alias, key in buckets.items()
+        },
+    )
+
+    tree = get_category_tree()
+    counts, totals = {}, {}
+    prices = dict.fromkeys(PRICE_BUCKETS, 0)
+    total = in_stock = 0
+    for row in rows:
+        counts[row['category_id']] = row['count']
+        total += row['count']
+        in_stock += row['in_stock']
+        for alias, key in buckets.items():
+            prices[key] += row[alias]
+        # Roll each count up to the category's ancestors
+        category = tree.by_id.get(row['category_id'])
+        for pk in (category.path.split('/')[:-1] if category else [row['category_id']]):
+            totals[int(pk)] = totals.get(int(pk), 0) + row['count']
+
+    categories = [
+        {
+            'id': category.pk,
+            'name': category.name,
+            'parent': category.parent_id,
+            'count': counts.get(category.pk, 0),
+            'total': totals[category.pk],
+        }
+        for category in tree.categories if category.pk in totals
+    ]
+    return {
+        'count': total,
+        'categories': categories,
+        'price': [{'range': key, 'count': count} for key, count in prices.items()],
+        'in_stock': {'true': in_stock, 'false': total - in_stock},
+    }
+
+
+def get_facets(queryset, filters):
+    """Facets of ``queryset``, cached under its normalized ``filters``."""
+    key = facets_cache_key(filters)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(queryset)
+        cache.set(key, facets, settings.PRODUCT_FACETS_CACHE_TIMEOUT)
+    return facets
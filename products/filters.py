@@ -0,0 +1,73 @@
+from django.db.models import Q
+
+from .models import Category
+from .search import search_enabled, search_products
+
+# Client ``ordering`` values and the sort keys they run as. Each pairs with
+# a composite (column, id) / (category, column, id) index on Product, and
+# id makes the order total. Anything else falls back to DEFAULT_ORDERING.
+ORDERINGS = {
+    'price': ('price', 'id'),
+    '-price': ('-price', '-id'),
+    'created_at': ('created_at', 'id'),
+    '-created_at': ('-created_at', '-id'),
+    'name': ('name', 'id'),
+    '-name': ('-name', '-id'),
+}
+DEFAULT_ORDERING = '-created_at'
+
+
+def int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_filters(params):
+    """Canonical form of the filter parameters, for use in cache keys."""
+    filters = {}
+    if category := params.get('category'):
+        filters['category'] = sorted({c.strip() for c in category.split(',') if c.strip()})
+        if params.get('include_subcategories') in ('1', 'true'):
+            filters['include_subcategories'] = True
+    for name in ('min_price', 'max_price'):
+        if value := params.get(name, '').strip():
+            filters[name] = value
+    if search := ' '.join(params.get('search', '').lower().split()):
+        filters['search'] = search
+    return filters
+
+
+def filter_products(queryset, params):
+    """Apply the catalog query parameters shared by the product list endpoints."""
+    # Category filter
+    if category := params.get('category'):
+        category_ids = category.split(',')
+        if params.get('include_subcategories') in ('1', 'true'):
+            subtrees = Q()
+            for path in Category.objects.filter(id__in=category_ids).values_list('path', flat=True):
+                subtrees |= Q(category__path__startswith=path)
+            queryset = queryset.filter(subtrees) if subtrees else queryset.none()
+        else:
+            queryset = queryset.filter(category__id__in=category_ids)
+
+    # Price range filter
+    if min_price := params.get('min_price'):
+        queryset = queryset.filter(price__gte=min_price)
+    if max_price := params.get('max_price'):
+        queryset = queryset.filter(price__lte=max_price)
+
+    # Search filter
+    if search := params.get('search'):
+        queryset = search_products(queryset, search)
+
+    # Ordering; searches without an explicit one keep relevance order where
+    # the backend ranks them
+    ordering = params.get('ordering')
+    if ordering in ORDERINGS:
+        queryset = queryset.order_by(*ORDERINGS[ordering])
+    elif not (params.get('search') and search_enabled()):
+        queryset = queryset.order_by(*ORDERINGS[DEFAULT_ORDERING])
+
+    return queryset
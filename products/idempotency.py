@@ -0,0 +1,136 @@
+"""
+``Idempotency-Key`` support for endpoints that must not run twice.
+
+The first request with a key claims it by inserting an ``IdempotencyKey``
+row; the unique constraint on (scope, owner, key) makes that claim atomic,
+so of two concurrent duplicates exactly one runs and the other gets a 409.
+Once the view finishes, its response is stored on the row and every retry
+with the same key and the same request gets it back verbatim without
+running the view again. A key reused for a different request is refused.
+Server errors release the key so the client can retry for real. Rows are
+purged after ``IDEMPOTENCY_KEY_TTL`` by the purge_idempotency_keys command.
+"""
+import functools
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .carts import CART_COOKIE
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def _digest(value):
+    return hashlib.sha256(value.encode()).hexdigest()[:32]
+
+
+def request_owner(request):
+    """
+    Namespace for the key, so clients that happen to pick the same key never
+    see each other's responses: the session user, else a hash of the bearer
+    credentials. Guests are told apart by their session or anonymous cart
+    cookie, and failing both by their address and user agent.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    if authorization := request.headers.get('Authorization'):
+        return 'auth:' + _digest(authorization)
+    session = getattr(request, 'session', None)
+    if session is not None and session.session_key:
+        return 'session:' + _digest(session.session_key)
+    if cart_token := request.COOKIES.get(CART_COOKIE):
+        return 'cart:' + _digest(cart_token)
+    return 'guest:' + _digest(f"{request.META.get('REMOTE_ADDR', '')}|{request.headers.get('User-Agent', '')}")
+
+
+def request_fingerprint(request):
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.path.encode(), request.body):
+        digest.update(part)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _claim(scope, owner, key, fingerprint):
+    """Insert the key row; returns it, or ``None`` if the key already exists."""
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(scope=scope, owner=owner, key=key, fingerprint=fingerprint)
+    except IntegrityError:
+        return None
+
+
+def _reclaim(existing):
+    """Take over an expired key or one whose first request never finished; returns whether it worked."""
+    now = timezone.now()
+    expired = existing.created_at < now - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    abandoned = existing.status_code is None and existing.created_at < now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+    if not (expired or abandoned):
+        return False
+    # Conditional on the row as read, so only one retry wins the takeover
+    return bool(IdempotencyKey.objects.filter(pk=existing.pk, created_at=existing.created_at).update(
+        created_at=now, status_code=None, content_type='', response_body=None, completed_at=None,
+    ))
+
+
+def _replay(record):
+    response = HttpResponse(bytes(record.response_body or b''), status=record.status_code, content_type=record.content_type or None)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(scope):
+    """
+    Make a view honour the ``Idempotency-Key`` request header. Requests
+    without the header are passed through unchanged.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return view(request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return JsonResponse({'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'}, status=400)
+
+            owner, fingerprint = request_owner(request), request_fingerprint(request)
+            record = _claim(scope, owner, key, fingerprint)
+            if record is None:
+                existing = IdempotencyKey.objects.get(scope=scope, owner=owner, key=key)
+                if _reclaim(existing):
+                    record = IdempotencyKey.objects.get(pk=existing.pk)
+                    record.fingerprint = fingerprint
+                    record.save(update_fields=['fingerprint'])
+                elif existing.fingerprint != fingerprint:
+                    return JsonResponse({'error': f'{HEADER} was already used for a different request'}, status=422)
+                elif existing.status_code is None:
+                    return JsonResponse({'error': 'A request with this idempotency key is still in progress'}, status=409)
+                else:
+                    return _replay(existing)
+
+            try:
+                response = view(request, *args, **kwargs)
+                if hasattr(response, 'render') and not response.is_rendered:
+                    response.render()
+            except Exception:
+                record.delete()
+                raise
+            if response.status_code >= 500 or response.streaming:
+                # Nothing reliable to replay: let the client try again
+                record.delete()
+                return response
+            record.status_code = response.status_code
+            record.content_type = response.get('Content-Type', '')
+            record.response_body = response.content
+            record.completed_at = timezone.now()
+            record.save(update_fields=['status_code', 'content_type', 'response_body', 'completed_at'])
+            return response
+        return wrapper
+    return decorator
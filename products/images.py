@@ -0,0 +1,126 @@
+"""
+Derived product images.
+
+Every uploaded product image gets resized JPEG and WebP renditions saved
+through the image field's own storage (S3 ``MediaStorage`` or local
+media). The result is recorded on ``Product.image_variants`` together with
+the source file it was made from, which makes generation idempotent: a
+product whose variants match its current image is skipped. Uploads
+schedule generation after the transaction commits, on a background
+thread, so the request never waits on Pillow.
+"""
+import hashlib
+import logging
+import posixpath
+import threading
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .cache import bump_catalog_version, invalidate_product_details
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+# Variant name -> target width in pixels. Images are never upscaled.
+VARIANT_WIDTHS = {
+    'thumb': 160,
+    'small': 320,
+    'medium': 640,
+    'large': 1024,
+}
+# Format -> (file extension, Pillow save options)
+VARIANT_FORMATS = {
+    'jpeg': ('jpg', {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('webp', {'format': 'WEBP', 'quality': 80, 'method': 6}),
+}
+
+
+def variant_name(source_name, size, extension):
+    directory, filename = posixpath.split(source_name)
+    stem = posixpath.splitext(filename)[0]
+    # Sources differing only in extension (pic.png, pic.jpg) must not share renditions
+    digest = hashlib.sha1(source_name.encode()).hexdigest()[:8]
+    return posixpath.join(directory, 'variants', f'{stem}-{digest}__{size}.{extension}')
+
+
+def _variants_changed(pk):
+    # update() skips the product signals; lists embed the images too, so bump the catalog version
+    transaction.on_commit(lambda: (invalidate_product_details([pk]), bump_catalog_version()))
+
+
+def variants_current(product):
+    return (product.image_variants or {}).get('source') == (product.image.name or None)
+
+
+def generate_variants(product, force=False):
+    """Render and store every variant of ``product.image``; returns whether anything was written."""
+    if not product.image:
+        if product.image_variants:
+            Product.objects.filter(pk=product.pk).update(image_variants={})
+            _variants_changed(product.pk)
+            return True
+        return False
+    if not force and variants_current(product):
+        return False
+
+    source = product.image.name
+    storage = product.image.storage
+    with storage.open(source, 'rb') as f:
+        image = ImageOps.exif_transpose(Image.open(f))
+        image.load()
+
+    sizes = {}
+    for size, target_width in VARIANT_WIDTHS.items():
+        width = min(target_width, image.width)
+        height = max(round(image.height * width / image.width), 1)
+        resized = image.resize((width, height), Image.LANCZOS)
+        entry = {'width': width, 'height': height}
+        for fmt, (extension, options) in VARIANT_FORMATS.items():
+            rendition = resized.convert('RGB') if fmt == 'jpeg' or resized.mode not in ('RGB', 'RGBA') else resized
+            buffer = BytesIO()
+            rendition.save(buffer, **options)
+            name = variant_name(source, size, extension)
+            # Replace rather than let storages that never overwrite pick a new name
+            if storage.exists(name):
+                storage.delete(name)
+            entry[fmt] = storage.save(name, ContentFile(buffer.getvalue()))
+        sizes[size] = entry
+
+    # Only record the variants if the image was not replaced meanwhile
+    updated = Product.objects.filter(pk=product.pk, image=source).update(
+        image_variants={'source': source, 'sizes': sizes},
+        updated_at=timezone.now(),
+    )
+    if updated:
+        _variants_changed(product.pk)
+    return bool(updated)
+
+
+def _generate(pk):
+    try:
+        product = Product.objects.filter(pk=pk).first()
+        if product is not None:
+            generate_variants(product)
+    except Exception as e:
+        logger.error(f"Error generating image variants for product {pk}: {str(e)}", exc_info=True)
+
+
+def _generate_in_thread(pk):
+    try:
+        _generate(pk)
+    finally:
+        # The thread got its own connection; do not leak it
+        connection.close()
+
+
+def schedule_variants(pk):
+    """Generate variants for product ``pk`` outside the current request."""
+    if settings.PRODUCT_IMAGE_VARIANTS_ASYNC:
+        threading.Thread(target=_generate_in_thread, args=(pk,), daemon=True).start()
+    else:
+        _generate(pk)
@@ -0,0 +1,230 @@
+"""
+Streaming product import from CSV or JSON Lines.
+
+Rows are read one at a time and applied in batches. Each batch looks up
+existing products by SKU with one query and upserts them with
+``bulk_create``/``bulk_update`` in its own transaction, so a 100k-row feed
+never sits in memory. A bad row only costs its own line: invalid rows are
+reported and skipped, and a batch the database rejects is retried one row
+per transaction. Bulk writes skip model signals, so search vectors and
+catalog caches are refreshed explicitly per batch.
+"""
+import csv
+import io
+import json
+import logging
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_catalog_version, invalidate_product_details
+from .models import Category, Product
+from .search import update_search_vectors
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'jsonl')
+UPDATE_FIELDS = ['name', 'description', 'price', 'stock', 'category', 'updated_at']
+# Separator between category names in a path such as "Apparel > Tops > Tees"
+CATEGORY_PATH_SEPARATOR = '>'
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line_number, row)`` from a binary stream; ``row`` may be a ``RowError``."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            # The physical line the row ends on; quoted fields may span lines
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                row = RowError(f"Invalid JSON: {e}")
+            if not isinstance(row, (dict, RowError)):
+                row = RowError("Expected a JSON object")
+            yield line_number, row
+    else:
+        raise ValueError(f"Unsupported format {fmt!r}; expected one of {', '.join(FORMATS)}")
+
+
+def format_for(filename):
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+class CategoryResolver:
+    """Category lookup by name or by "Parent > Child" path from one query."""
+
+    def __init__(self):
+        categories = list(Category.objects.all())
+        by_id = {category.pk: category for category in categories}
+        self.by_path = {}
+        self.by_name = {}
+        for category in categories:
+            names = [by_id[int(pk)].name for pk in category.path.split('/')[:-1] if int(pk) in by_id]
+            self.by_path[self._key(names)] = category
+            # A bare name is only usable when it is unambiguous
+            self.by_name.setdefault(category.name.strip().lower(), []).append(category)
+
+    @staticmethod
+    def _key(names):
+        return tuple(name.strip().lower() for name in names)
+
+    def resolve(self, value):
+        value = str(value or '').strip()
+        if not value:
+            raise RowError("category is required")
+        if CATEGORY_PATH_SEPARATOR in value:
+            category = self.by_path.get(self._key(value.split(CATEGORY_PATH_SEPARATOR)))
+            if category is None:
+                raise RowError(f"Unknown category path {value!r}")
+            return category
+        matches = self.by_name.get(value.lower(), [])
+        if not matches:
+            raise RowError(f"Unknown category {value!r}")
+        if len(matches) > 1:
+            raise RowError(f"Category name {value!r} is ambiguous; use its full path")
+        return matches[0]
+
+
+class ImportResult:
+    def __init__(self, max_errors):
+        self.max_errors = max_errors
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line_number, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line_number, 'error': message})
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
+
+
+class ProductImporter:
+    def __init__(self, batch_size=1000, dry_run=False, max_errors=1000, progress=None):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.progress = progress
+        self.result = ImportResult(max_errors)
+        self.categories = CategoryResolver()
+
+    def run(self, rows):
+        batch = {}
+        for line_number, row in rows:
+            self.result.rows += 1
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                values = self.clean(row)
+            except RowError as e:
+                self.result.add_error(line_number, str(e))
+                continue
+            # The last row for a SKU wins within a batch
+            batch[values['sku']] = (line_number, values)
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = {}
+        if batch:
+            self.flush(batch)
+        return self.result
+
+    def clean(self, row):
+        sku = str(row.get('sku') or '').strip()
+        if not sku:
+            raise RowError("sku is required")
+        name = str(row.get('name') or '').strip()
+        if not name:
+            raise RowError("name is required")
+        try:
+            price = Decimal(str(row.get('price')).strip())
+        except (InvalidOperation, ValueError):
+            raise RowError(f"Invalid price {row.get('price')!r}")
+        if not price.is_finite() or price < 0:
+            raise RowError(f"Invalid price {row.get('price')!r}")
+        try:
+            stock = int(row.get('stock') or 0)
+        except (TypeError, ValueError):
+            raise RowError(f"Invalid stock {row.get('stock')!r}")
+        if stock < 0:
+            raise RowError(f"Invalid stock {row.get('stock')!r}")
+        return {
+            'sku': sku,
+            'name': name,
+            'description': str(row.get('description') or ''),
+            'price': price.quantize(Decimal('0.01')),
+            'stock': stock,
+            'category': self.categories.resolve(row.get('category')),
+        }
+
+    def flush(self, batch):
+        if self.dry_run:
+            self.report()
+            return
+        try:
+            with transaction.atomic():
+                created, updated = self.upsert(batch)
+        except Exception as e:
+            logger.warning(f"Product import batch failed, retrying row by row: {str(e)}")
+            created, updated = self.upsert_rows(batch)
+        self.result.created += len(created)
+        self.result.updated += len(updated)
+        invalidate_product_details([product.pk for product in updated])
+        bump_catalog_version()
+        self.report()
+
+    def upsert(self, batch):
+        existing = Product.objects.in_bulk(list(batch), field_name='sku')
+        now = timezone.now()
+        to_create, to_update = [], []
+        for sku, (_, values) in batch.items():
+            product = existing.get(sku)
+            if product is None:
+                to_create.append(Product(**values))
+                continue
+            for field, value in values.items():
+                setattr(product, field, value)
+            product.updated_at = now  # bulk_update skips auto_now
+            to_update.append(product)
+        Product.objects.bulk_create(to_create, batch_size=self.batch_size)
+        Product.objects.bulk_update(to_update, UPDATE_FIELDS, batch_size=self.batch_size)
+        update_search_vectors(Product.objects.filter(sku__in=list(batch)))
+        return to_create, to_update
+
+    def upsert_rows(self, batch):
+        """Apply a rejected batch one row per transaction, so only the offending rows fail."""
+        created, updated = [], []
+        for sku, (line_number, values) in batch.items():
+            try:
+                with transaction.atomic():
+                    row_created, row_updated = self.upsert({sku: (line_number, values)})
+            except Exception as e:
+                logger.error(f"Product import row {line_number} failed: {str(e)}", exc_info=True)
+                self.result.add_error(line_number, str(e))
+                continue
+            created += row_created
+            updated += row_updated
+        return created, updated
+
+    def report(self):
+        if self.progress:
+            self.progress(self.result)
@@ -0,0 +1,139 @@
+"""
+Stock reservation for checkout.
+
+Stock for a whole order costs two statements however many lines it has.
+A ``SELECT ... FOR UPDATE ORDER BY id`` first locks the product rows in
+id order, so two multi-line orders always queue for their common
+products in the same order and cannot deadlock; the locked counts also
+tell exactly which lines are short. Then a single conditional ``UPDATE
+... SET stock = stock - n WHERE stock >= n``, with each product's ``n``
+picked by a ``CASE`` on its id, takes the stock. An order is filled
+completely or not at all. Callers reserve as the last step of the
+transaction that creates the order: a hot product's row lock is then
+only held for the commit, which keeps flash-sale checkouts from queueing
+behind each other.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .cache import bump_catalog_version, invalidate_product_details
+from .models import Order, Product
+
+
+class InsufficientStock(Exception):
+    def __init__(self, shortages):
+        # product id -> units still available (0 if the product is gone)
+        self.shortages = shortages
+        super().__init__(f"Not enough stock for products {', '.join(map(str, sorted(shortages)))}")
+
+    def as_dict(self):
+        return {
+            'error': 'Not enough stock',
+            'shortages': [
+                {'product': product_id, 'available': available}
+                for product_id, available in sorted(self.shortages.items())
+            ],
+        }
+
+
+def _quantities(items):
+    quantities = Counter()
+    for product_id, quantity in items:
+        quantities[product_id] += quantity
+    return quantities
+
+
+def _stock_changed(product_ids):
+    # update() skips the product signals, so refresh the catalog caches here
+    transaction.on_commit(lambda: (invalidate_product_details(product_ids), bump_catalog_version()))
+
+
+def _per_product(quantities):
+    return Case(
+        *(When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()),
+        output_field=IntegerField(),
+    )
+
+
+def _lock(product_ids):
+    """Lock the product rows in id order; returns their stock by id."""
+    return dict(
+        Product.objects.select_for_update().filter(pk__in=product_ids).order_by('id').values_list('id', 'stock')
+    )
+
+
+def reserve_stock(items):
+    """
+    Take stock for ``(product_id, quantity)`` pairs, all or nothing. Raises
+    ``InsufficientStock`` with every short product; nothing is taken then.
+    """
+    quantities = _quantities(items)
+    if not quantities:
+        return
+    with transaction.atomic():
+        available = _lock(list(quantities))
+        shortages = {
+            product_id: available.get(product_id, 0)
+            for product_id, quantity in quantities.items()
+            if available.get(product_id, 0) < quantity
+        }
+        if not shortages:
+            wanted = _per_product(quantities)
+            taken = Product.objects.filter(pk__in=list(quantities), stock__gte=wanted).update(
+                stock=F('stock') - wanted, updated_at=timezone.now(),
+            )
+            if taken != len(quantities):
+                # Only where the SELECT cannot lock rows (SQLite); report every line
+                shortages = {product_id: available.get(product_id, 0) for product_id in quantities}
+        if shortages:
+            # Leaving the block with an exception rolls back anything taken
+            raise InsufficientStock(shortages)
+    _stock_changed(list(quantities))
+
+
+def release_stock(items):
+    """Return stock taken by ``reserve_stock``."""
+    quantities = _quantities(items)
+    if not quantities:
+        return
+    with transaction.atomic():
+        # Same lock order as reserve_stock, so a release cannot deadlock with a checkout
+        _lock(list(quantities))
+        Product.objects.filter(pk__in=list(quantities)).update(
+            stock=F('stock') + _per_product(quantities), updated_at=timezone.now(),
+        )
+    _stock_changed(list(quantities))
+
+
+def release_order(order):
+    """Give back the stock of a reserved ``order``; safe to call more than once."""
+    with transaction.atomic():
+        # The flag is flipped under the row lock, so concurrent releases cannot both restock
+        released = Order.objects.filter(pk=order.pk, stock_reserved=True).update(stock_reserved=False)
+        if released:
+            release_stock(order.items.values_list('product_id', 'quantity'))
+    order.stock_reserved = False
+    return bool(released)
+
+
+def delete_order(order):
+    """
+    Delete ``order``, giving back its reserved stock only while it is still
+    open; the stock of a shipped or delivered order has left the warehouse.
+    """
+    with transaction.atomic():
+        if order.status in Order.OPEN_STATUSES:
+            release_order(order)
+        order.delete()
+
+
+def cancel_order(order):
+    """Mark ``order`` cancelled and return its reserved stock."""
+    with transaction.atomic():
+        release_order(order)
+        order.status = Order.CANCELLED
+        order.save(update_fields=['status', 'updated_at'])
+    return order
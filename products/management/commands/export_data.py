@@ -0,0 +1,33 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from products.exporters import DATASETS, OUTPUTS, export_chunks
+
+
+class Command(BaseCommand):
+    help = "Stream products, orders or order items to a CSV or NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(DATASETS))
+        parser.add_argument('--output', choices=list(OUTPUTS), default='csv')
+        parser.add_argument('--file', help="Destination path; defaults to stdout.")
+        parser.add_argument('--gzip', action='store_true', help="Gzip the output.")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Rows fetched per round trip.")
+
+    def handle(self, *args, **options):
+        chunks = export_chunks(
+            options['dataset'],
+            output=options['output'],
+            compress=options['gzip'],
+            chunk_size=options['chunk_size'],
+        )
+        if options['file']:
+            with open(options['file'], 'wb') as destination:
+                for chunk in chunks:
+                    destination.write(chunk)
+            self.stderr.write(self.style.SUCCESS(f"Exported {options['dataset']} to {options['file']}"))
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from products.images import generate_variants
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Backfill resized JPEG/WebP variants for product images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Regenerate variants that are already current.")
+        parser.add_argument('ids', nargs='*', type=int, help="Only these product ids.")
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='').exclude(image__isnull=True).defer('search_vector').order_by('id')
+        if options['ids']:
+            products = products.filter(pk__in=options['ids'])
+
+        generated = skipped = failed = 0
+        for product in products.iterator(chunk_size=200):
+            try:
+                if generate_variants(product, force=options['force']):
+                    generated += 1
+                else:
+                    skipped += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Product {product.pk}: {str(e)}")
+        self.stdout.write(self.style.SUCCESS(f"{generated} generated, {skipped} already current, {failed} failed"))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importers import FORMATS, ProductImporter, format_for, read_rows
+
+
+class Command(BaseCommand):
+    help = "Stream a CSV or JSON Lines product feed into the catalog, upserting on SKU."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Feed file with sku, name, description, price, stock and category.")
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Validate rows without writing.")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        fmt = options['format'] or format_for(options['path'])
+        importer = ProductImporter(
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            progress=self.report_progress,
+        )
+        try:
+            with open(options['path'], 'rb') as stream:
+                result = importer.run(read_rows(stream, fmt))
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for error in result.errors:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+        if result.failed > len(result.errors):
+            self.stderr.write(f"... {result.failed - len(result.errors)} more errors not shown")
+        self.stdout.write(self.style.SUCCESS(
+            f"{result.rows} rows: {result.created} created, {result.updated} updated, {result.failed} failed"
+            + (" (dry run)" if options['dry_run'] else "")
+        ))
+
+    def report_progress(self, result):
+        self.stdout.write(
+            f"{result.rows} rows read, {result.created} created, {result.updated} updated, {result.failed} failed"
+        )
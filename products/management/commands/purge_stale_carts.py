@@ -0,0 +1,65 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from products.models import Cart, CartItem
+
+DB_SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+
+
+class Command(BaseCommand):
+    help = "Delete abandoned anonymous carts and expired sessions in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.ANONYMOUS_CART_MAX_AGE_DAYS,
+            help="Delete anonymous carts untouched for this many days.",
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows deleted per transaction.")
+        parser.add_argument('--skip-sessions', action='store_true', help="Leave expired sessions alone.")
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be deleted.")
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        # A cart is stale only if neither it nor any of its items changed since the cutoff
+        stale_carts = (
+            Cart.objects.filter(user__isnull=True, updated_at__lt=cutoff)
+            .exclude(items__updated_at__gte=cutoff)
+            .order_by('updated_at')
+        )
+
+        if options['dry_run']:
+            carts = stale_carts.count()
+            items = CartItem.objects.filter(cart__in=stale_carts).count()
+            sessions = 0 if options['skip_sessions'] else Session.objects.filter(expire_date__lt=timezone.now()).count()
+            self.stdout.write(f"Would delete {carts} carts, {items} cart items and {sessions} sessions")
+            return
+
+        carts = items = 0
+        while ids := list(stale_carts.values_list('id', flat=True)[:batch_size]):
+            # Short transactions: each batch holds its row locks only briefly
+            with transaction.atomic():
+                items += CartItem.objects.filter(cart_id__in=ids).delete()[0]
+                carts += Cart.objects.filter(id__in=ids).delete()[0]
+
+        sessions = 0
+        if not options['skip_sessions']:
+            if settings.SESSION_ENGINE == DB_SESSION_ENGINE:
+                sessions = self.purge_sessions(batch_size)
+            else:
+                self.stdout.write(f"Sessions are not stored in the database ({settings.SESSION_ENGINE}); skipped")
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {carts} carts, {items} cart items and {sessions} sessions"))
+
+    def purge_sessions(self, batch_size):
+        # clearsessions deletes every expired row in one statement; batch it instead
+        expired = Session.objects.filter(expire_date__lt=timezone.now())
+        deleted = 0
+        while keys := list(expired.values_list('session_key', flat=True)[:batch_size]):
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+        return deleted
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from products.associations import BATCH_SIZE, update_associations
+
+
+class Command(BaseCommand):
+    help = "Fold orders placed since the last run into the frequently-bought-together index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Orders per transaction.")
+
+    def handle(self, *args, **options):
+        def progress(processed, last_order_id):
+            self.stdout.write(f"{processed} orders processed, up to order {last_order_id}")
+
+        processed = update_associations(batch_size=max(options['batch_size'], 1), progress=progress)
+        self.stdout.write(self.style.SUCCESS(f"{processed} new orders indexed"))
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import F, Sum
+from django.test import RequestFactory
+
+from products.cache import set_product_detail
+from products.models import Product
+from products.serializers import ProductSerializer
+
+
+class Command(BaseCommand):
+    help = "Render the best-selling products into the product detail cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=100, help="Number of products to warm.")
+        parser.add_argument(
+            '--host', default=settings.ALLOWED_HOSTS[0],
+            help="Host used to build absolute media URLs, as a live request would.",
+        )
+
+    def handle(self, *args, **options):
+        products = (
+            Product.objects.for_api()
+            .annotate(sold=Sum('orderitem__quantity'))
+            .order_by(F('sold').desc(nulls_last=True), '-updated_at')[:options['top']]
+        )
+        request = RequestFactory().get('/', HTTP_HOST=options['host'], secure=True)
+        context = {'request': request}
+
+        warmed = 0
+        for product in products:
+            set_product_detail(product.pk, ProductSerializer(product, context=context).data, product.updated_at)
+            warmed += 1
+        self.stdout.write(self.style.SUCCESS(f"Warmed {warmed} product detail entries."))
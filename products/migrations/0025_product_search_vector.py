@@ -0,0 +1,50 @@
+# Generated by Django 5.1.6 on 2026-10-17 17:48
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_indexes(apps, schema_editor):
+    # GIN indexes, the pg_trgm extension and tsvector backfill are
+    # PostgreSQL-only; other backends keep the plain icontains search.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS products_product_search_vector_gin "
+        "ON products_product USING gin (search_vector)"
+    )
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS products_product_name_trgm "
+        "ON products_product USING gin (name gin_trgm_ops)"
+    )
+    schema_editor.execute(
+        "UPDATE products_product p SET search_vector = "
+        "setweight(to_tsvector('english', coalesce(p.name, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(p.description, '')), 'B') || "
+        "setweight(to_tsvector('english', coalesce(c.name, '')), 'C') "
+        "FROM products_category c WHERE c.id = p.category_id"
+    )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS products_product_name_trgm")
+    schema_editor.execute("DROP INDEX IF EXISTS products_product_search_vector_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0024_alter_cartitem_created_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.6 on 2026-10-17 17:51
+
+from django.db import migrations, models
+
+
+def build_paths(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    categories = list(Category.objects.all())
+    by_id = {category.id: category for category in categories}
+
+    def path_of(category):
+        if not category.path:
+            parent = by_id.get(category.parent_id)
+            category.path = (path_of(parent) if parent else '') + f"{category.id}/"
+            category.depth = category.path.count('/') - 1
+        return category.path
+
+    for category in categories:
+        path_of(category)
+    Category.objects.bulk_update(categories, ['path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0025_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,10 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import F, Prefetch, Sum, Value, prefetch_related_objects
+from django.db.models.functions import Coalesce, Concat, Substr
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.utils import timezone
 
 User = get_user_model()
@@ -8,14 +13,75 @@ class Category(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     parent = models.ForeignKey('self', related_name='children', on_delete=models.CASCADE, null=True, blank=True)
+    # Materialized path of ancestor ids including this one, e.g. "3/17/42/"
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='')
+    depth = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.name
     class Meta:
         verbose_name_plural = "Categories"
 
+    def save(self, *args, **kwargs):
+        parent_path = ''
+        if self.parent_id:
+            parent_path = Category.objects.values_list('path', flat=True).get(pk=self.parent_id)
+            if self.path and parent_path.startswith(self.path):
+                raise ValueError("A category cannot be moved under its own subtree")
+        # One transaction so signal handlers' on_commit hooks see the final path
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._update_path(parent_path)
+
+    def _update_path(self, parent_path):
+        path = f"{parent_path}{self.pk}/"
+        if path == self.path:
+            return
+        old_path, old_depth = self.path, self.depth
+        depth = path.count('/') - 1
+        Category.objects.filter(pk=self.pk).update(path=path, depth=depth)
+        if old_path:
+            # The node moved: rewrite the prefix of its whole subtree
+            Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                path=Concat(Value(path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (depth - old_depth),
+            )
+        self.path, self.depth = path, depth
+
+    def get_ancestors(self):
+        ancestor_ids = [int(pk) for pk in self.path.split('/')[:-2]]
+        return Category.objects.filter(pk__in=ancestor_ids).order_by('depth')
+
+    def get_descendants(self, include_self=False):
+        descendants = Category.objects.filter(path__startswith=self.path)
+        return descendants if include_self else descendants.exclude(pk=self.pk)
+
+    def get_products(self):
+        """Products in this category or any of its descendants."""
+        return Product.objects.filter(category__path__startswith=self.path)
+
+    @staticmethod
+    def children_map(categories):
+        """Group ``categories`` by ``parent_id`` to walk a tree in memory."""
+        children = {}
+        for category in categories:
+            children.setdefault(category.parent_id, []).append(category)
+        return children
+
+
+class ProductQuerySet(models.QuerySet):
+    def for_api(self):
+        """
+        Rows as the API serializes them. The nested category is read from
+        the category tree cache, so no join is needed; the search vector is
+        never serialized, so it is not fetched.
+        """
+        return self.defer('search_vector')
+
 
 class Product(models.Model):
+    # Supplier stock-keeping unit; the key bulk imports upsert on
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=200)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -24,6 +90,25 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     image = models.ImageField(upload_to='products/', null=True, blank=True)
+    # Resized renditions of image, maintained by products.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # Maintained by products.signals; indexed with GIN on PostgreSQL (migration 0025)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        # One index per catalog query shape: optional category filter plus a
+        # whitelisted sort key (products.filters.ORDERINGS), id as tiebreaker.
+        # Descending sorts scan the same indexes backwards.
+        indexes = [
+            models.Index(fields=['category', 'price', 'id'], name='product_cat_price_idx'),
+            models.Index(fields=['category', 'created_at', 'id'], name='product_cat_created_idx'),
+            models.Index(fields=['category', 'name', 'id'], name='product_cat_name_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_idx'),
+            models.Index(fields=['created_at', 'id'], name='product_created_idx'),
+            models.Index(fields=['name', 'id'], name='product_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -31,6 +116,10 @@ class Product(models.Model):
         return self.stock >= quantity
 
 class Order(models.Model):
+    CANCELLED = 'Cancelled'
+    # Not yet shipped: deleting one of these gives its stock back
+    OPEN_STATUSES = ('Pending', 'Awaiting Payment')
+
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     email = models.EmailField(default=False)
     status = models.CharField(max_length=20, default='Pending')
@@ -39,12 +128,22 @@ class Order(models.Model):
     total_price = models.DecimalField(max_digits=10, decimal_places=2) 
     shipping_details = models.JSONField(default=dict)
     payment_method = models.CharField(max_length=20, default='cod')
+    # Whether the items' stock is currently taken; maintained by products.inventory
+    stock_reserved = models.BooleanField(default=False, editable=False)
 
     def save(self, *args, **kwargs):
         if self.user:
             self.email = self.user.email
         super().save(*args, **kwargs)
 
+    @staticmethod
+    def items_prefetch():
+        """Order items with their products, in one query for any number of orders."""
+        return Prefetch(
+            'items',
+            queryset=OrderItem.objects.select_related('product').defer('product__search_vector').order_by('id'),
+        )
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -53,25 +152,131 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.quantity} of {self.product.name}"
+
+class ProductAssociation(models.Model):
+    """
+    Number of orders that contained both ``product`` and ``related``.
+    Both directions of a pair are stored so "bought together with X" is a
+    single index range scan. Maintained by products.associations.
+    """
+    product = models.ForeignKey(Product, related_name='associations', on_delete=models.CASCADE)
+    related = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'related'], name='product_association_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['product', '-count', 'related'], name='product_association_top_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} + {self.related_id}: {self.count}"
+
+class ProductAssociationCheckpoint(models.Model):
+    """Highest order id already folded into ProductAssociation, one row per index."""
+    name = models.CharField(max_length=50, unique=True)
+    last_order_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: order {self.last_order_id}"
+
+class IdempotencyKey(models.Model):
+    """
+    A client's ``Idempotency-Key`` for one endpoint, with the response to
+    replay on retries. ``status_code`` stays null while the first request
+    is still running. Maintained by products.idempotency.
+    """
+    scope = models.CharField(max_length=100)
+    # Who sent it: user id or a hash of the credentials, so keys never collide across clients
+    owner = models.CharField(max_length=100)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    response_body = models.BinaryField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'owner', 'key'], name='idempotency_key_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'], name='idempotency_key_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.key}"
     
+class CartQuerySet(models.QuerySet):
+    def with_items(self):
+        """Carts with their items and products loaded in one extra query."""
+        return self.prefetch_related(Cart.items_prefetch())
+
+    def with_totals(self):
+        """Carts annotated with ``annotated_total`` and ``annotated_item_count`` by the database."""
+        return self.annotate(
+            annotated_total=Coalesce(
+                Sum(F('items__quantity') * F('items__product__price'), output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+                Value(Decimal('0.00')),
+            ),
+            annotated_item_count=Coalesce(Sum('items__quantity'), Value(0)),
+        )
+
+
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True)
-    session_id = models.CharField(max_length=100, null=True, blank=True)
+    session_id = models.CharField(max_length=100, null=True, blank=True, db_index=True)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CartQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Anonymous carts by age, for purge_stale_carts
+            models.Index(fields=['updated_at'], name='cart_anonymous_updated_idx', condition=models.Q(user__isnull=True)),
+        ]
     
     def __str__(self):
         return f"Cart {self.id} - {'User: ' + self.user.email if self.user else 'Session: ' + self.session_id}"
+
+    @staticmethod
+    def items_prefetch():
+        return Prefetch(
+            'items',
+            queryset=CartItem.objects.select_related('product').defer('product__search_vector').order_by('id'),
+        )
+
+    def load_items(self):
+        """(Re)load this cart's items and their products with a single query; returns the cart."""
+        getattr(self, '_prefetched_objects_cache', {}).pop('items', None)
+        prefetch_related_objects([self], Cart.items_prefetch())
+        return self
+
+    def _items_loaded(self):
+        return 'items' in getattr(self, '_prefetched_objects_cache', {})
     
     @property
     def total(self):
         """Calculate the total price of all items in the cart"""
-        return sum(item.subtotal for item in self.items.all())
+        if hasattr(self, 'annotated_total'):
+            return self.annotated_total
+        if self._items_loaded():
+            return sum((item.subtotal for item in self.items.all()), Decimal('0.00'))
+        return Cart.objects.with_totals().values_list('annotated_total', flat=True).get(pk=self.pk)
     
     @property
     def item_count(self):
         """Calculate the total number of items in the cart"""
-        return sum(item.quantity for item in self.items.all())
+        if hasattr(self, 'annotated_item_count'):
+            return self.annotated_item_count
+        if self._items_loaded():
+            return sum(item.quantity for item in self.items.all())
+        return self.items.aggregate(count=Coalesce(Sum('quantity'), Value(0)))['count']
     
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE)
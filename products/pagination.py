@@ -1,15 +1,141 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from functools import partial
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .counts import CachedCountPaginator
+from .filters import DEFAULT_ORDERING, ORDERINGS, normalize_filters
 
 class ProductPagination(PageNumberPagination):
     page_size = 8
     page_size_query_param = 'limit'
     max_page_size = 100
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.django_paginator_class = partial(
+            CachedCountPaginator,
+            filters=normalize_filters(request.query_params),
+            estimate=request.query_params.get(self.count_query_param) == 'estimate',
+        )
+        return super().paginate_queryset(queryset, request, view)
     
     def get_paginated_response(self, data):
         return Response({
             'count': self.page.paginator.count,
+            'count_exact': self.page.paginator.count_exact,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        })
+
+
+class ProductCursorPagination(BasePagination):
+    """
+    Keyset pagination for the catalog, selected per request with ``?cursor=``.
+
+    Rows are ordered by one of the whitelisted ``ORDERINGS`` with ``id`` as
+    the tiebreaker and each page resumes after the (value, id) of the row
+    that ended the previous one, so deep pages cost the same as the first
+    and no count query is needed.
+
+    Searches are ordered the same way here: a relevance rank cannot be
+    resumed from a cursor, so clients wanting the most relevant results
+    first should page a search by page number instead.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 8
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request)
+        field = self.ordering.lstrip('-')
+        cursor = self.decode_cursor(request, queryset.model._meta.get_field(field))
+
+        reverse = cursor is not None and cursor['reverse']
+        # Walking backwards scans the index in the opposite direction
+        descending = self.ordering.startswith('-') != reverse
+        if descending:
+            queryset = queryset.order_by(f'-{field}', '-id')
+        else:
+            queryset = queryset.order_by(field, 'id')
+
+        if cursor is not None:
+            op = 'lt' if descending else 'gt'
+            value = cursor['value']
+            queryset = queryset.filter(
+                Q(**{f'{field}__{op}e': value}),
+                Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'id__{op}': cursor['id']}),
+            )
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
             'next': self.get_next_link(),
             'previous': self.get_previous_link(),
             'results': data
-        })
\ No newline at end of file
+        })
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get('ordering', '')
+        return ordering if ordering in ORDERINGS else DEFAULT_ORDERING
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, obj, reverse):
+        value = getattr(obj, self.ordering.lstrip('-'))
+        value = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+        payload = json.dumps({'v': value, 'i': obj.pk, 'r': int(reverse)}, separators=(',', ':'))
+        token = base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+        return replace_query_param(remove_query_param(self.base_url, 'page'), self.cursor_query_param, token)
+
+    def decode_cursor(self, request, field):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return {
+                'value': field.to_python(payload['v']),
+                'id': int(payload['i']),
+                'reverse': bool(payload['r']),
+            }
+        except (KeyError, TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
@@ -0,0 +1,58 @@
+"""
+Catalog search backend.
+
+On PostgreSQL products are matched against a weighted ``search_vector``
+(name, description, category name) and ranked with ``SearchRank``, with a
+trigram word match on ``name`` for typo tolerance: the term is compared
+with the closest word run of the name, so "shrit" still finds "Blue cotton
+shirt". Both are served by GIN indexes (see migration 0025). Other
+databases fall back to the original ``name__icontains`` filter.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import F, OuterRef, Q, Subquery
+
+SEARCH_CONFIG = 'english'
+
+
+def search_enabled():
+    return connection.vendor == 'postgresql'
+
+
+def product_search_vector():
+    # Imported lazily: models imports this module for the field definition.
+    from .models import Category
+
+    category_name = Subquery(Category.objects.filter(pk=OuterRef('category_id')).values('name')[:1])
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+        + SearchVector(category_name, weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(queryset):
+    """Recompute ``search_vector`` for every product in ``queryset``."""
+    if not search_enabled():
+        return 0
+    return queryset.update(search_vector=product_search_vector())
+
+
+def search_products(queryset, term):
+    """Filter ``queryset`` by ``term``, most relevant first on PostgreSQL."""
+    term = term.strip()
+    if not term:
+        return queryset
+    if not search_enabled():
+        return queryset.filter(name__icontains=term)
+
+    query = SearchQuery(term, config=SEARCH_CONFIG, search_type='websearch')
+    return (
+        queryset
+        .filter(Q(search_vector=query) | Q(name__trigram_word_similar=term))
+        .annotate(
+            search_rank=SearchRank(F('search_vector'), query),
+            search_similarity=TrigramWordSimilarity(term, 'name'),
+        )
+        .order_by('-search_rank', '-search_similarity', 'id')
+    )
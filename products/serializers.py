@@ -5,6 +5,8 @@ from django.contrib.auth.models import User
 from rest_framework import serializers
 from .models import *
 from django.contrib.auth.models import User
+from .category_tree import get_category_tree
+from .images import variants_current
 
 class CategorySerializer(serializers.ModelSerializer):
     subcategories = serializers.SerializerMethodField()
@@ -15,19 +17,133 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description', 'subcategories', 'parent']
 
     def get_subcategories(self, obj):
-        return CategorySerializer(obj.children.all(), many=True).data
+        # Only top-level categories list their subcategories
+        if obj.parent_id is not None:
+            return None
+        children = self.context.get('category_children')
+        if children is None:
+            # One subtree fetch per root, shared by every row of a list
+            subtrees = self.context.setdefault('category_subtrees', {})
+            if obj.pk not in subtrees:
+                subtrees[obj.pk] = Category.children_map(obj.get_descendants())
+            children = subtrees[obj.pk]
+        return CategorySerializer(children.get(obj.pk, []), many=True, context=self.context).data
+
+    def validate_parent(self, value):
+        if value and self.instance and value.path.startswith(self.instance.path):
+            raise serializers.ValidationError("A category cannot be moved under its own subtree.")
+        return value
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        if instance.parent is not None:
+        if instance.parent_id is not None:
             representation.pop('subcategories', None)
         return representation
+class CachedCategoryField(serializers.Field):
+    """Nested category read from the per-worker category tree instead of the database."""
+
+    def __init__(self, compact=False, **kwargs):
+        # compact: only id and name, as product cards show them
+        self.compact = compact
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        return instance
+
+    def to_representation(self, instance):
+        # Resolved once per response; every row shares the same snapshot
+        tree = self.context.get('category_tree')
+        if tree is None:
+            tree = self.context.setdefault('category_tree', get_category_tree())
+        representation = tree.get(instance.category_id)
+        if representation is None:
+            # Created after the snapshot was taken
+            representation = CategorySerializer(instance.category, context=self.context).data
+        if self.compact:
+            return {'id': representation['id'], 'name': representation['name']}
+        return representation
+
 class ProductSerializer(serializers.ModelSerializer):
-    category = CategorySerializer(read_only=True)
+    """
+    Full product representation, narrowed per request with ``fields``
+    (keep only these), ``omit`` (drop these) or ``view='card'`` (the
+    compact listing card).
+    """
+    category = CachedCategoryField()
+    images = serializers.SerializerMethodField()
+
+    CARD_FIELDS = ['id', 'name', 'price', 'stock', 'image', 'images', 'category']
+    # Model columns each serializer field reads, where not just its own
+    FIELD_COLUMNS = {
+        'category': ['category_id'],
+        'images': ['image', 'image_variants'],
+    }
 
     class Meta:
         model = Product
-        fields = '__all__'  # Fixed the syntax error here
+        exclude = ['search_vector', 'image_variants']
+
+    def __init__(self, *args, fields=None, omit=None, view=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if view == 'card':
+            fields = fields or self.CARD_FIELDS
+            self.fields['category'] = CachedCategoryField(compact=True)
+        for name in self.excluded_fields(fields, omit):
+            self.fields.pop(name)
+
+    @classmethod
+    def field_names(cls):
+        return set(cls._declared_fields) | {
+            field.name for field in Product._meta.concrete_fields if field.name not in cls.Meta.exclude
+        }
+
+    @classmethod
+    def excluded_fields(cls, fields=None, omit=None):
+        names = cls.field_names()
+        excluded = set(omit or ()) & names
+        if fields:
+            excluded |= names - set(fields)
+        return excluded
+
+    @classmethod
+    def columns_for(cls, fields=None, omit=None, view=None):
+        """
+        Model columns a selection reads, for ``QuerySet.only()``; ``None``
+        when every field is shown. Sort keys are always loaded because
+        pagination cursors read them, and ``updated_at`` because the
+        detail view's validators do.
+        """
+        if view == 'card':
+            fields = fields or cls.CARD_FIELDS
+        excluded = cls.excluded_fields(fields, omit)
+        if not excluded:
+            return None
+        columns = {'id', 'price', 'created_at', 'name', 'updated_at'}
+        for name in cls.field_names() - excluded:
+            columns.update(cls.FIELD_COLUMNS.get(name, [name]))
+        return sorted(columns)
+
+    def get_images(self, obj):
+        """Resized renditions by size name, plus ready-made ``srcset`` strings."""
+        sizes = (obj.image_variants or {}).get('sizes')
+        if not sizes or not variants_current(obj):
+            return None
+        storage = obj.image.storage
+        request = self.context.get('request')
+
+        def url(name):
+            url = storage.url(name)
+            return request.build_absolute_uri(url) if request else url
+
+        images = {
+            size: {'width': entry['width'], 'height': entry['height'], 'jpeg': url(entry['jpeg']), 'webp': url(entry['webp'])}
+            for size, entry in sizes.items()
+        }
+        by_width = sorted(images.values(), key=lambda entry: entry['width'])
+        images['srcset'] = ', '.join(f"{entry['jpeg']} {entry['width']}w" for entry in by_width)
+        images['srcset_webp'] = ', '.join(f"{entry['webp']} {entry['width']}w" for entry in by_width)
+        return images
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -48,6 +164,8 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = '__all__' 
+        # Priced on the server from the catalog
+        read_only_fields = ['total_price']
 
 class CartItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
@@ -68,4 +186,16 @@ class CartSerializer(serializers.ModelSerializer):
         fields = ['id', 'items', 'total', 'item_count' ]
 
     def get_total(self, obj):
-        return sum(item.product.price * item.quantity for item in obj.items.all())
\ No newline at end of file
+        # Cart.total reads the annotation or the prefetched items when present
+        return obj.total
+class CartOperationSerializer(serializers.Serializer):
+    """One step of a batched cart mutation."""
+    op = serializers.ChoiceField(choices=['add', 'set', 'remove'])
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0, default=1)
+
+    def validate(self, attrs):
+        # set 0 removes a line; adding nothing would leave an empty one
+        if attrs['op'] == 'add' and attrs['quantity'] < 1:
+            raise serializers.ValidationError({'quantity': "Ensure this value is greater than or equal to 1."})
+        return attrs
@@ -0,0 +1,69 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version, bump_category_version, invalidate_product_details
+from .carts import CART_COOKIE, invalidate_cart_summary, merge_anonymous_cart
+from .images import schedule_variants, variants_current
+from .models import Cart, CartItem, Category, Product
+from .search import update_search_vectors
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_search_vector(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    update_search_vectors(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Product)
+def refresh_image_variants(sender, instance, raw=False, **kwargs):
+    if raw or variants_current(instance):
+        return
+    pk = instance.pk
+    transaction.on_commit(lambda: schedule_variants(pk))
+
+
+@receiver(post_save, sender=Category)
+def refresh_category_search_vectors(sender, instance, created, raw=False, **kwargs):
+    # A renamed category changes the weight-C part of its products' vectors
+    if raw or created:
+        return
+    update_search_vectors(instance.products.all())
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # After commit, so no worker can rebuild from data it cannot see yet
+    transaction.on_commit(bump_catalog_version)
+    pk = instance.pk  # delete() clears instance.pk before the commit
+    transaction.on_commit(lambda: invalidate_product_details([pk]))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_tree(sender, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(bump_category_version)
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def invalidate_cart(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_cart_summary(instance.cart_id)
+
+
+@receiver(user_logged_in)
+def merge_anonymous_cart_on_login(sender, request, user, **kwargs):
+    # Token logins are merged on the first authenticated cart request instead
+    if request is None or CART_COOKIE not in request.COOKIES:
+        return
+    cart, _ = Cart.objects.get_or_create(user=user)
+    merge_anonymous_cart(request, cart)
@@ -1,3 +1,857 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import warnings
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.paginator import UnorderedObjectListWarning
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from .associations import update_associations
+from .category_tree import get_category_tree
+from .images import generate_variants
+from .importers import ProductImporter, read_rows
+from .checkout import place_order
+from .inventory import InsufficientStock, cancel_order, delete_order, reserve_stock
+from .models import Cart, CartItem, Category, Order, OrderItem, Product
+
+
+class ProductQueryBudgetTests(TestCase):
+    """
+    Serializing products must cost a fixed number of queries however many
+    rows a page holds. Raise a budget only together with the change that
+    needs the extra query.
+    """
+    # COUNT(*) + page of products + category tree snapshot
+    LIST_BUDGET = 3
+    # product row + category tree snapshot
+    DETAIL_BUDGET = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = Category.objects.create(name='Apparel')
+        cls.child = Category.objects.create(name='Tops', parent=cls.root)
+        cls.leaf = Category.objects.create(name='Tees', parent=cls.child)
+
+    def setUp(self):
+        # Counts and the category tree are cached across requests
+        cache.clear()
+
+    def create_products(self, count):
+        categories = [self.root, self.child, self.leaf]
+        Product.objects.bulk_create(
+            Product(
+                name=f'Product {i}',
+                description='Description',
+                price=Decimal('10.00') + i,
+                category=categories[i % len(categories)],
+                stock=5,
+            )
+            for i in range(count)
+        )
+
+    def test_list_query_count_does_not_grow_with_page_size(self):
+        self.create_products(3)
+        with self.assertNumQueries(self.LIST_BUDGET):
+            response = self.client.get('/api/products/', {'limit': 3})
+        self.assertEqual(len(response.json()['results']), 3)
+
+        cache.clear()
+        self.create_products(30)
+        with self.assertNumQueries(self.LIST_BUDGET):
+            response = self.client.get('/api/products/', {'limit': 30})
+        self.assertEqual(len(response.json()['results']), 30)
+
+    def test_list_includes_nested_category_tree(self):
+        self.create_products(3)
+        results = self.client.get('/api/products/', {'ordering': 'price'}).json()['results']
+        root_category = results[0]['category']
+        self.assertEqual(root_category['name'], 'Apparel')
+        self.assertEqual([c['name'] for c in root_category['subcategories']], ['Tops'])
+
+    def test_cursor_list_query_count(self):
+        self.create_products(20)
+        with self.assertNumQueries(self.LIST_BUDGET - 1):
+            response = self.client.get('/api/products/', {'cursor': '', 'limit': 20})
+        self.assertEqual(len(response.json()['results']), 20)
+
+    def test_detail_query_count(self):
+        self.create_products(1)
+        product = Product.objects.get()
+        with self.assertNumQueries(self.DETAIL_BUDGET):
+            response = self.client.get(f'/api/products/{product.pk}/')
+        self.assertEqual(response.json()['category']['name'], 'Apparel')
+
+    def product_selects(self, queries):
+        return [query['sql'] for query in queries if query['sql'].startswith('SELECT') and 'FROM "products_product"' in query['sql']]
+
+    def test_field_selection_narrows_columns_and_payload(self):
+        self.create_products(3)
+        with CaptureQueriesContext(connection) as queries:
+            results = self.client.get('/api/products/', {'fields': 'id,name'}).json()['results']
+        self.assertEqual({key for result in results for key in result}, {'id', 'name'})
+        self.assertTrue(self.product_selects(queries))
+        self.assertFalse(any('"description"' in sql for sql in self.product_selects(queries)))
+
+        results = self.client.get('/api/products/', {'omit': 'description'}).json()['results']
+        self.assertNotIn('description', results[0])
+        self.assertIn('stock', results[0])
+
+    def test_detail_field_selection_is_one_narrow_query(self):
+        self.create_products(1)
+        product = Product.objects.get()
+        with CaptureQueriesContext(connection) as queries:
+            body = self.client.get(f'/api/products/{product.pk}/', {'fields': 'name'}).json()
+        self.assertEqual(body, {'name': product.name})
+        # updated_at is loaded up front for the validators, not reloaded as a deferred field
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"description"', queries[0]['sql'])
+
+    def test_card_view_is_compact(self):
+        self.create_products(1)
+        with CaptureQueriesContext(connection) as queries:
+            card = self.client.get('/api/products/', {'view': 'card'}).json()['results'][0]
+        self.assertEqual(set(card), {'id', 'name', 'price', 'stock', 'image', 'images', 'category'})
+        self.assertEqual(card['category'], {'id': self.root.pk, 'name': 'Apparel'})
+        self.assertFalse(any('"description"' in sql for sql in self.product_selects(queries)))
+
+    def test_category_list_served_from_tree_cache(self):
+        self.client.get('/api/categories/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/categories/')
+        self.assertEqual(len(response.json()), 3)
+
+    def test_unchanged_list_returns_not_modified_without_serializing(self):
+        self.create_products(3)
+        response = self.client.get('/api/products/')
+        # Validated against the cached catalog version alone
+        with self.assertNumQueries(0):
+            revalidated = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.first().save()
+        changed = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+
+    def test_changed_product_invalidates_detail_etag(self):
+        self.create_products(1)
+        product = Product.objects.get()
+        etag = self.client.get(f'/api/products/{product.pk}/')['ETag']
+        self.assertEqual(self.client.get(f'/api/products/{product.pk}/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        product.price = Decimal('99.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        response = self.client.get(f'/api/products/{product.pk}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['price'], '99.00')
+
+    def test_cached_detail_skips_the_database(self):
+        self.create_products(1)
+        product = Product.objects.get()
+        self.client.get(f'/api/products/{product.pk}/')
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/api/products/{product.pk}/')
+        self.assertEqual(response.json()['id'], product.pk)
+
+    def test_cart_query_count_does_not_grow_with_items(self):
+        self.create_products(6)
+        products = list(Product.objects.order_by('id'))
+        self.client.get('/api/cart/view_cart/')
+        cart = Cart.objects.get()
+        get_category_tree()
+
+        def view_cart():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/cart/view_cart/')
+            return len(queries), response.json()
+
+        CartItem.objects.create(cart=cart, product=products[0], quantity=2)
+        one_item, _ = view_cart()
+        CartItem.objects.bulk_create(CartItem(cart=cart, product=product, quantity=1) for product in products[1:])
+        six_items, body = view_cart()
+        self.assertEqual(six_items, one_item)
+        self.assertEqual(body['item_count'], 7)
+        self.assertEqual(Decimal(str(body['total'])), sum((p.price for p in products), products[0].price))
+
+    def test_batch_preserves_order_and_reports_missing(self):
+        self.create_products(3)
+        first, second, third = Product.objects.order_by('id').values_list('id', flat=True)
+        ids = f'{third},{first},0,{second}'
+        with self.assertNumQueries(self.DETAIL_BUDGET):
+            response = self.client.get('/api/products/batch/', {'ids': ids})
+        body = response.json()
+        self.assertEqual([product['id'] for product in body['results']], [third, first, second])
+        self.assertEqual(body['missing'], [0])
+
+        # Found details are cached now; only unknown ids go to the database
+        with self.assertNumQueries(0):
+            self.client.get('/api/products/batch/', {'ids': f'{first},{second},{third}'})
+
+    def test_batch_rejects_too_many_ids(self):
+        ids = ','.join(str(i) for i in range(1, 102))
+        self.assertEqual(self.client.get('/api/products/batch/', {'ids': ids}).status_code, 400)
+        self.assertEqual(self.client.get('/api/products/batch/', {'ids': 'a,b'}).status_code, 400)
+
+    def test_facets_come_from_one_grouped_query(self):
+        self.create_products(6)
+        with self.assertNumQueries(2):  # grouped aggregate + category tree snapshot
+            facets = self.client.get('/api/products/facets/').json()
+        self.assertEqual(facets['count'], 6)
+        by_name = {category['name']: category for category in facets['categories']}
+        self.assertEqual(by_name['Apparel']['count'], 2)
+        self.assertEqual(by_name['Apparel']['total'], 6)
+        self.assertEqual(by_name['Tees']['total'], 2)
+        self.assertEqual(dict((bucket['range'], bucket['count']) for bucket in facets['price'])['0-25'], 6)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/products/facets/').json(), facets)
+        filtered = self.client.get('/api/products/facets/', {'min_price': '12'}).json()
+        self.assertEqual(filtered['count'], 4)
+
+
+class ProductAssociationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Apparel')
+        cls.shirt, cls.tie, cls.socks = (
+            Product.objects.create(name=name, description='', price=Decimal('10.00'), category=category)
+            for name in ('Shirt', 'Tie', 'Socks')
+        )
+
+    def place_order(self, *products):
+        order = Order.objects.create(email='buyer@example.com', total_price=Decimal('0.00'))
+        OrderItem.objects.bulk_create(OrderItem(order=order, product=product, price=product.price) for product in products)
+        # Older than the settle delay, so the next run picks it up
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(hours=1))
+        return order
+
+    def related_names(self, product):
+        get_category_tree()
+        # The association scan, joined to the related products
+        with self.assertNumQueries(1):
+            results = self.client.get(f'/api/products/{product.pk}/related/').json()['results']
+        return [result['name'] for result in results]
+
+    def test_related_products_ranked_by_copurchases(self):
+        self.place_order(self.shirt, self.tie)
+        self.place_order(self.shirt, self.tie, self.socks)
+        self.assertEqual(update_associations(), 2)
+        self.assertEqual(self.related_names(self.shirt), ['Tie', 'Socks'])
+        self.assertEqual(self.related_names(self.socks), ['Shirt', 'Tie'])
+
+    def test_only_new_orders_are_processed(self):
+        self.place_order(self.shirt, self.tie)
+        update_associations()
+        self.assertEqual(update_associations(), 0)
+
+        self.place_order(self.shirt, self.socks)
+        self.place_order(self.shirt, self.socks)
+        self.assertEqual(update_associations(), 2)
+        self.assertEqual(self.related_names(self.shirt), ['Socks', 'Tie'])
+
+
+class InventoryReservationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Apparel')
+        cls.shirt = Product.objects.create(name='Shirt', description='', price=Decimal('10.00'), category=category, stock=5)
+        cls.tie = Product.objects.create(name='Tie', description='', price=Decimal('5.00'), category=category, stock=1)
+
+    def stock(self, product):
+        return Product.objects.values_list('stock', flat=True).get(pk=product.pk)
+
+    def test_order_reserves_every_line(self):
+        order = place_order([(self.shirt.pk, 2), (self.tie.pk, 1)], email='buyer@example.com')
+        self.assertEqual((self.stock(self.shirt), self.stock(self.tie)), (3, 0))
+        self.assertTrue(Order.objects.get(pk=order.pk).stock_reserved)
+
+    def test_short_line_takes_nothing(self):
+        with self.assertRaises(InsufficientStock) as raised:
+            reserve_stock([(self.shirt.pk, 2), (self.tie.pk, 2)])
+        self.assertEqual(raised.exception.shortages, {self.tie.pk: 1})
+        self.assertEqual((self.stock(self.shirt), self.stock(self.tie)), (5, 1))
+
+    def test_rows_are_locked_in_id_order_before_the_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            reserve_stock([(self.tie.pk, 1), (self.shirt.pk, 1)])
+        statements = [query['sql'] for query in queries if query['sql'].startswith(('SELECT', 'UPDATE'))]
+        self.assertEqual(len(statements), 2)
+        lock, update = statements
+        self.assertTrue(lock.startswith('SELECT') and update.startswith('UPDATE'))
+        self.assertIn('ORDER BY "products_product"."id" ASC', lock)
+        if connection.features.has_select_for_update:
+            self.assertIn('FOR UPDATE', lock)
+
+    def test_order_total_is_priced_on_the_server(self):
+        response = self.client.post('/api/orders/', {
+            'email': 'buyer@example.com',
+            'items': [{'product_id': self.shirt.pk, 'quantity': 2}],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['total_price'], '20.00')
+        self.assertEqual(self.stock(self.shirt), 3)
+
+    def test_cancel_releases_stock_once(self):
+        order = place_order([(self.shirt.pk, 2)], email='buyer@example.com')
+        cancel_order(order)
+        cancel_order(order)
+        self.assertEqual(self.stock(self.shirt), 5)
+        self.assertEqual(Order.objects.get(pk=order.pk).status, Order.CANCELLED)
+
+    def test_deleting_only_open_orders_releases_stock(self):
+        def reserved_order(status):
+            return place_order([(self.shirt.pk, 1)], email='buyer@example.com', status=status)
+
+        delivered, pending = reserved_order('Delivered'), reserved_order('Pending')
+        delete_order(delivered)
+        self.assertEqual(self.stock(self.shirt), 3)
+        delete_order(pending)
+        self.assertEqual(self.stock(self.shirt), 4)
+        self.assertFalse(Order.objects.exists())
+
+
+@skipUnless(connection.vendor == 'postgresql', "SQLite serializes writers with a database lock")
+class ConcurrentReservationTests(TransactionTestCase):
+    """Many checkouts racing for one hot product must never oversell it."""
+    BUYERS = 40
+    STOCK = 15
+
+    def test_hot_product_is_never_oversold(self):
+        category = Category.objects.create(name='Flash sale')
+        product = Product.objects.create(name='Hot', description='', price=Decimal('1.00'), category=category, stock=self.STOCK)
+        barrier = threading.Barrier(self.BUYERS)
+        outcomes = []
+
+        def buy():
+            try:
+                barrier.wait()
+                reserve_stock([(product.pk, 1)])
+                outcomes.append(True)
+            except InsufficientStock:
+                outcomes.append(False)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=buy) for _ in range(self.BUYERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes.count(True), self.STOCK)
+        self.assertEqual(outcomes.count(False), self.BUYERS - self.STOCK)
+        self.assertEqual(Product.objects.get(pk=product.pk).stock, 0)
+
+
+@override_settings(ANONYMOUS_CART_STORAGE='cache')
+class AnonymousCartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Apparel')
+        cls.shirt = Product.objects.create(name='Shirt', description='', price=Decimal('10.00'), category=category, stock=5)
+        cls.tie = Product.objects.create(name='Tie', description='', price=Decimal('5.00'), category=category, stock=5)
+
+    def setUp(self):
+        cache.clear()
+
+    def add(self, product, quantity):
+        return self.client.post(
+            '/api/cart/add_to_cart/', {'product_id': product.pk, 'quantity': quantity}, content_type='application/json',
+        )
+
+    def test_anonymous_cart_never_writes_to_the_database(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/cart/view_cart/').json()['items'], [])
+        self.add(self.shirt, 2)
+        self.add(self.shirt, 1)
+        body = self.client.get('/api/cart/view_cart/').json()
+        self.assertEqual([(item['id'], item['quantity']) for item in body['items']], [(self.shirt.pk, 3)])
+        self.assertEqual(body['item_count'], 3)
+        self.assertFalse(Cart.objects.exists())
+        self.assertFalse(Session.objects.exists())
+
+    def test_cart_merges_into_user_cart_on_first_authenticated_request(self):
+        user = User.objects.create_user('buyer', 'buyer@example.com', 'secret')
+        CartItem.objects.create(cart=Cart.objects.create(user=user), product=self.shirt, quantity=1)
+        self.add(self.shirt, 2)
+        self.add(self.tie, 1)
+
+        self.client.force_login(user)
+        response = self.client.get('/api/cart/view_cart/')
+        body = response.json()
+        self.assertEqual(sorted((item['product']['name'], item['quantity']) for item in body['items']), [('Shirt', 3), ('Tie', 1)])
+        # The spent cookie is dropped, so later requests skip the cache lookup
+        self.assertEqual((response.cookies['cart_token'].value, response.cookies['cart_token']['max-age']), ('', 0))
+        # Merged exactly once
+        body = self.client.get('/api/cart/view_cart/').json()
+        self.assertEqual(body['item_count'], 4)
+
+
+class CartMutationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Apparel')
+        cls.shirt, cls.tie, cls.socks = (
+            Product.objects.create(name=name, description='', price=Decimal('10.00'), category=category, stock=5)
+            for name in ('Shirt', 'Tie', 'Socks')
+        )
+
+    def batch(self, *operations):
+        return self.client.post('/api/cart/batch/', {'operations': list(operations)}, content_type='application/json')
+
+    def test_operations_apply_in_order(self):
+        self.batch({'op': 'add', 'product_id': self.shirt.pk, 'quantity': 1}, {'op': 'add', 'product_id': self.tie.pk})
+        response = self.batch(
+            {'op': 'add', 'product_id': self.shirt.pk, 'quantity': 2},
+            {'op': 'remove', 'product_id': self.tie.pk},
+            {'op': 'set', 'product_id': self.socks.pk, 'quantity': 4},
+        )
+        lines = {item['product']['name']: item['quantity'] for item in response.json()['items']}
+        self.assertEqual(lines, {'Shirt': 3, 'Socks': 4})
+        self.assertEqual(CartItem.objects.count(), 2)
+
+    def test_adding_nothing_is_rejected(self):
+        response = self.batch({'op': 'add', 'product_id': self.shirt.pk, 'quantity': 0})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('quantity', response.json()[0])
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_add_to_cart_is_one_write_within_stock(self):
+        def add(quantity):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    '/api/cart/add_to_cart/', {'product_id': self.shirt.pk, 'quantity': quantity}, content_type='application/json',
+                )
+            writes = [query['sql'] for query in queries if 'products_cartitem' in query['sql'] and not query['sql'].startswith('SELECT')]
+            return response, writes
+
+        self.client.get('/api/cart/view_cart/')
+        response, writes = add(2)
+        self.assertEqual(len(writes), 1)
+        response, writes = add(3)
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(response.json()['item_count'], 5)
+        response, _ = add(1)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(CartItem.objects.get().quantity, 5)
+
+    @mock.patch('products.carts.ON_CONFLICT_VENDORS', ())
+    def test_add_to_cart_without_on_conflict(self):
+        def add(quantity):
+            return self.client.post(
+                '/api/cart/add_to_cart/', {'product_id': self.shirt.pk, 'quantity': quantity}, content_type='application/json',
+            )
+
+        self.assertEqual(add(2).status_code, 200)
+        self.assertEqual(add(3).json()['item_count'], 5)
+        self.assertEqual(add(1).status_code, 400)
+        self.assertEqual(CartItem.objects.get().quantity, 5)
+
+    def test_summary_is_cached_until_the_cart_changes(self):
+        user = User.objects.create_user('buyer', 'buyer@example.com', 'secret')
+        self.client.force_login(user)
+        self.batch({'op': 'add', 'product_id': self.shirt.pk, 'quantity': 2})
+        self.assertEqual(self.client.get('/api/cart/summary/').json(), {'item_count': 2, 'total': 20.0})
+        # Session, user and cart lookups only; the summary itself is cached
+        with self.assertNumQueries(3):
+            self.client.get('/api/cart/summary/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.batch({'op': 'add', 'product_id': self.tie.pk})
+        self.assertEqual(self.client.get('/api/cart/summary/').json()['item_count'], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            CartItem.objects.get(product=self.tie).delete()
+        self.assertEqual(self.client.get('/api/cart/summary/').json()['item_count'], 2)
+
+    def test_failing_operation_applies_nothing(self):
+        response = self.batch(
+            {'op': 'add', 'product_id': self.shirt.pk, 'quantity': 1},
+            {'op': 'set', 'product_id': self.tie.pk, 'quantity': 6},
+            {'op': 'add', 'product_id': 0},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.json()['errors']], [1, 2])
+        self.assertFalse(CartItem.objects.exists())
+
+
+class PurgeStaleCartsTests(TestCase):
+    def test_only_abandoned_anonymous_carts_are_deleted(self):
+        category = Category.objects.create(name='Apparel')
+        product = Product.objects.create(name='Shirt', description='', price=Decimal('10.00'), category=category, stock=5)
+        user = User.objects.create_user('buyer', 'buyer@example.com', 'secret')
+        stale, recent_item, owned = (
+            Cart.objects.create(session_id='stale'), Cart.objects.create(session_id='recent'), Cart.objects.create(user=user),
+        )
+        for cart in (stale, recent_item, owned):
+            CartItem.objects.create(cart=cart, product=product)
+        long_ago = timezone.now() - timedelta(days=60)
+        Cart.objects.update(updated_at=long_ago)
+        CartItem.objects.exclude(cart=recent_item).update(updated_at=long_ago)
+
+        call_command('purge_stale_carts', '--batch-size', '1', '--skip-sessions', stdout=io.StringIO())
+        self.assertEqual(set(Cart.objects.values_list('pk', flat=True)), {recent_item.pk, owned.pk})
+        self.assertEqual(CartItem.objects.count(), 2)
+
+
+@override_settings(PRODUCT_IMAGE_VARIANTS_ASYNC=False)
+class ProductImageVariantTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Apparel')
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+    def upload(self, filename, width=800, height=400, fmt='PNG'):
+        buffer = io.BytesIO()
+        Image.new('RGB', (width, height), 'red').save(buffer, format=fmt)
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(
+                name=filename, description='', price=Decimal('10.00'), category=self.category, stock=5,
+                image=SimpleUploadedFile(filename, buffer.getvalue()),
+            )
+        product.refresh_from_db()
+        return product
+
+    def test_variants_are_generated_once(self):
+        product = self.upload('pic.png')
+        sizes = product.image_variants['sizes']
+        self.assertEqual(product.image_variants['source'], product.image.name)
+        self.assertEqual(sizes['thumb']['width'], 160)
+        # Never upscaled
+        self.assertEqual((sizes['large']['width'], sizes['large']['height']), (800, 400))
+        storage = product.image.storage
+        self.assertTrue(all(storage.exists(entry[fmt]) for entry in sizes.values() for fmt in ('jpeg', 'webp')))
+        self.assertFalse(generate_variants(product))
+
+    def test_new_variants_invalidate_cached_lists(self):
+        product = self.upload('pic.png')
+        etag = self.client.get('/api/products/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(generate_variants(product, force=True))
+        self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_sources_differing_in_extension_keep_their_own_variants(self):
+        png = self.upload('pic.png', width=300)
+        jpeg = self.upload('pic.jpg', width=200, fmt='JPEG')
+        png_thumb, jpeg_thumb = png.image_variants['sizes']['thumb']['jpeg'], jpeg.image_variants['sizes']['thumb']['jpeg']
+        self.assertNotEqual(png_thumb, jpeg_thumb)
+        with png.image.storage.open(png.image_variants['sizes']['large']['jpeg']) as f:
+            self.assertEqual(Image.open(f).width, 300)
+
+    def test_detail_lists_renditions_and_srcset(self):
+        product = self.upload('pic.png')
+        images = self.client.get(f'/api/products/{product.pk}/').json()['images']
+        self.assertEqual(images['thumb']['width'], 160)
+        self.assertTrue(images['medium']['webp'].endswith('.webp'))
+        self.assertEqual(
+            images['srcset'],
+            ', '.join(f"{images[size]['jpeg']} {images[size]['width']}w" for size in ('thumb', 'small', 'medium', 'large')),
+        )
+
+
+class ProductImportTests(TestCase):
+    HEADER = 'sku,name,description,price,stock,category\n'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.apparel = Category.objects.create(name='Apparel')
+        cls.tops = Category.objects.create(name='Tops', parent=cls.apparel)
+        cls.kids = Category.objects.create(name='Kids')
+        cls.kids_tops = Category.objects.create(name='Tops', parent=cls.kids)
+
+    def run_import(self, body, **kwargs):
+        stream = io.BytesIO((self.HEADER + body).encode())
+        return ProductImporter(**kwargs).run(read_rows(stream, 'csv'))
+
+    def test_categories_resolve_by_name_or_path(self):
+        result = self.run_import(
+            'A1,Shirt,,10,1,apparel\n'
+            'A2,Tee,,10,1,Apparel > Tops\n'
+            'A3,Kids tee,,10,1, kids>tops \n'
+            'A4,Ambiguous,,10,1,Tops\n'
+            'A5,Lost,,10,1,Apparel > Shoes\n'
+        )
+        categories = dict(Product.objects.values_list('sku', 'category_id'))
+        self.assertEqual(categories, {'A1': self.apparel.pk, 'A2': self.tops.pk, 'A3': self.kids_tops.pk})
+        self.assertEqual([error['line'] for error in result.errors], [5, 6])
+        self.assertIn('ambiguous', result.errors[0]['error'])
+
+    def test_rows_upsert_on_sku_and_last_row_wins_within_a_batch(self):
+        self.run_import('A1,Shirt,,10,1,Apparel\n')
+        result = self.run_import('A1,Shirt v2,,12,3,Apparel\nB1,Tie,,5,2,Apparel\nA1,Shirt v3,,15,4,Apparel\n')
+        self.assertEqual((result.created, result.updated, result.failed), (1, 1, 0))
+        shirt = Product.objects.get(sku='A1')
+        self.assertEqual((shirt.name, shirt.price, shirt.stock), ('Shirt v3', Decimal('15.00'), 4))
+        self.assertEqual(Product.objects.count(), 2)
+
+    def test_errors_report_physical_lines(self):
+        result = self.run_import(
+            'A1,Shirt,"Soft\ncotton",10,1,Apparel\n'
+            'A2,Tie,,abc,1,Apparel\n'
+            ',Nameless,,1,1,Apparel\n'
+        )
+        self.assertEqual(result.errors, [
+            {'line': 4, 'error': "Invalid price 'abc'"},
+            {'line': 5, 'error': 'sku is required'},
+        ])
+        self.assertEqual(Product.objects.get().description, 'Soft\ncotton')
+
+    def test_rejected_batch_is_retried_row_by_row(self):
+        # Valid for the importer, too large for the stock column
+        with self.assertLogs('products.importers', 'WARNING'):
+            result = self.run_import('A1,Shirt,,10,1,Apparel\nA2,Tie,,5,99999999999999999999,Apparel\nA3,Socks,,2,1,Apparel\n')
+        self.assertEqual((result.created, result.failed), (2, 1))
+        self.assertEqual([error['line'] for error in result.errors], [3])
+        self.assertEqual(set(Product.objects.values_list('sku', flat=True)), {'A1', 'A3'})
+
+
+class ProductCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.apparel = Category.objects.create(name='Apparel')
+        cls.tees = Category.objects.create(name='Tees', parent=cls.apparel)
+        cls.shoes = Category.objects.create(name='Shoes')
+        Product.objects.bulk_create(
+            Product(name=f'Product {i}', description='', price=Decimal('10.00'), category=category, stock=1)
+            for i, category in enumerate([cls.apparel] * 2 + [cls.tees] * 3 + [cls.shoes] * 4)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def list(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            body = self.client.get('/api/products/', params).json()
+        counted = any('COUNT(' in query['sql'] for query in queries)
+        return body, counted
+
+    def test_exact_count_is_cached_per_filter_set(self):
+        body, counted = self.list(limit=2)
+        self.assertEqual((body['count'], body['count_exact'], counted), (9, True, True))
+        body, counted = self.list(limit=2, page=2)
+        self.assertEqual((body['count'], counted), (9, False))
+        body, counted = self.list(limit=2, category=str(self.shoes.pk))
+        self.assertEqual((body['count'], counted), (4, True))
+
+    def test_large_unfiltered_catalog_gets_the_table_estimate(self):
+        with mock.patch('products.counts.table_estimate', return_value=1_000_000):
+            body, counted = self.list()
+        self.assertEqual((body['count'], body['count_exact'], counted), (1_000_000, False, False))
+
+    def test_estimate_on_request(self):
+        with mock.patch('products.counts.planner_estimate', return_value=7):
+            body, counted = self.list(category=str(self.shoes.pk), count='estimate')
+        self.assertEqual((body['count'], body['count_exact'], counted), (7, False, False))
+        # No estimate available (SQLite): exact count instead
+        body, _ = self.list(category=str(self.shoes.pk), count='estimate')
+        self.assertEqual((body['count'], body['count_exact']), (4, True))
+
+    def test_subtree_count_follows_a_reparent(self):
+        subtree = {'category': str(self.apparel.pk), 'include_subcategories': '1'}
+        self.assertEqual(self.list(**subtree)[0]['count'], 5)
+        self.tees.parent = self.shoes
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tees.save()
+        self.assertEqual(self.list(**subtree)[0]['count'], 2)
+
+
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Apparel')
+        cls.shirt, cls.tie, cls.scarf = (
+            Product.objects.create(name=name, description=description, price=Decimal('10.00'), category=category, stock=1)
+            for name, description in [
+                ('Blue cotton shirt', 'Soft and breathable'),
+                ('Silk tie', 'Goes with any shirt'),
+                ('Wool scarf', 'Warm'),
+            ]
+        )
+
+    def search(self, term, **params):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            body = self.client.get('/api/products/', {'search': term, **params}).json()
+        self.assertFalse([w for w in caught if issubclass(w.category, UnorderedObjectListWarning)])
+        return [result['name'] for result in body['results']]
+
+    @skipUnless(connection.vendor == 'postgresql', "Full-text and trigram search need PostgreSQL")
+    def test_ranked_search_tolerates_typos(self):
+        self.assertEqual(self.search('shirt')[:2], ['Blue cotton shirt', 'Silk tie'])
+        self.assertEqual(self.search('shrit')[0], 'Blue cotton shirt')
+
+    @skipUnless(connection.vendor != 'postgresql', "Covers the fallback for other databases")
+    def test_fallback_matches_names_in_catalog_order(self):
+        Product.objects.filter(pk=self.shirt.pk).update(created_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(self.search('S'), ['Wool scarf', 'Silk tie', 'Blue cotton shirt'])
+        self.assertEqual(self.search('s', ordering='name'), ['Blue cotton shirt', 'Silk tie', 'Wool scarf'])
+        self.assertEqual(self.search('shrit'), [])
+
+
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # apparel > tops > tees, shoes
+        self.apparel = Category.objects.create(name='Apparel')
+        self.tops = Category.objects.create(name='Tops', parent=self.apparel)
+        self.tees = Category.objects.create(name='Tees', parent=self.tops)
+        self.shoes = Category.objects.create(name='Shoes')
+
+    def reload(self, *categories):
+        return [Category.objects.get(pk=category.pk) for category in categories]
+
+    def test_paths_follow_the_parent_chain(self):
+        self.assertEqual(self.tees.path, f'{self.apparel.pk}/{self.tops.pk}/{self.tees.pk}/')
+        self.assertEqual((self.apparel.depth, self.tops.depth, self.tees.depth), (0, 1, 2))
+        self.assertEqual(list(self.tees.get_ancestors()), [self.apparel, self.tops])
+
+    def test_move_rewrites_the_whole_subtree(self):
+        self.tops.parent = self.shoes
+        self.tops.save()
+        tops, tees = self.reload(self.tops, self.tees)
+        self.assertEqual(tops.path, f'{self.shoes.pk}/{self.tops.pk}/')
+        self.assertEqual(tees.path, f'{self.shoes.pk}/{self.tops.pk}/{self.tees.pk}/')
+        self.assertEqual((tops.depth, tees.depth), (1, 2))
+        self.assertEqual(list(self.apparel.get_descendants()), [])
+
+        # Up to the root
+        tops.parent = None
+        tops.save()
+        tops, tees = self.reload(self.tops, self.tees)
+        self.assertEqual((tops.path, tops.depth), (f'{self.tops.pk}/', 0))
+        self.assertEqual((tees.path, tees.depth), (f'{self.tops.pk}/{self.tees.pk}/', 1))
+
+    def test_move_under_own_subtree_is_rejected(self):
+        self.apparel.parent = self.tees
+        with self.assertRaises(ValueError):
+            self.apparel.save()
+        self.assertIsNone(Category.objects.get(pk=self.apparel.pk).parent_id)
+
+        response = self.client.patch(
+            f'/api/categories/{self.apparel.pk}/', {'parent': self.tees.pk}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('parent', response.json())
+
+    def test_products_include_the_subtree(self):
+        shirt, tee, boot = (
+            Product.objects.create(name=name, description='', price=Decimal('10.00'), category=category, stock=1)
+            for name, category in [('Shirt', self.tops), ('Tee', self.tees), ('Boot', self.shoes)]
+        )
+        self.assertEqual(set(self.apparel.get_products()), {shirt, tee})
+        self.assertEqual(set(self.tees.get_products()), {tee})
+        results = self.client.get(
+            '/api/products/', {'category': self.apparel.pk, 'include_subcategories': '1'},
+        ).json()['results']
+        self.assertEqual({result['name'] for result in results}, {'Shirt', 'Tee'})
+        results = self.client.get('/api/products/', {'category': self.apparel.pk}).json()['results']
+        self.assertEqual(results, [])
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Apparel')
+        # Long runs of equal prices, so pages end in the middle of ties
+        Product.objects.bulk_create(
+            Product(name=f'Product {i}', description='', price=Decimal(10 + i % 3), category=category, stock=1)
+            for i in range(11)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def page(self, url, params=None):
+        body = self.client.get(url, params).json()
+        return [result['id'] for result in body['results']], body['next'], body['previous']
+
+    def test_pages_walk_forward_and_back_across_ties(self):
+        for ordering, keys in [('price', ('price', 'id')), ('-price', ('-price', '-id'))]:
+            expected = list(Product.objects.order_by(*keys).values_list('id', flat=True))
+            pages = [self.page('/api/products/', {'cursor': '', 'ordering': ordering, 'limit': 3})]
+            while pages[-1][1]:
+                pages.append(self.page(pages[-1][1]))
+            self.assertEqual([pk for ids, _, _ in pages for pk in ids], expected)
+            self.assertIsNone(pages[0][2])
+
+            # Back from the last page through every previous link
+            backwards = [pages[-1]]
+            while backwards[-1][2]:
+                backwards.append(self.page(backwards[-1][2]))
+            self.assertEqual([ids for ids, _, _ in reversed(backwards)], [ids for ids, _, _ in pages])
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Apparel')
+        cls.shirt = Product.objects.create(sku='A1', name='Shirt', description='Soft, "cotton"', price=Decimal('10.00'), category=category, stock=5)
+        cls.order = Order.objects.create(email='buyer@example.com', total_price=Decimal('20.00'), shipping_details={'city': 'Lagos'})
+        OrderItem.objects.create(order=cls.order, product=cls.shirt, quantity=2, price=Decimal('10.00'))
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'secret', is_staff=True)
+
+    def export(self, dataset, **params):
+        response = self.client.get(f'/api/export/{dataset}/', params)
+        return response, b''.join(response.streaming_content) if response.streaming else None
+
+    def test_export_is_admin_only(self):
+        self.assertEqual(self.client.get('/api/export/products/').status_code, 403)
+        self.client.force_login(User.objects.create_user('buyer', 'buyer@example.com', 'secret'))
+        self.assertEqual(self.client.get('/api/export/products/').status_code, 403)
+
+    def test_csv_export(self):
+        self.client.force_login(self.admin)
+        response, body = self.export('products')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="products.csv"')
+        header, row = csv.reader(io.StringIO(body.decode()))
+        self.assertEqual(header[:6], ['id', 'sku', 'name', 'description', 'price', 'stock'])
+        self.assertEqual(row[1:5] + row[7:8], ['A1', 'Shirt', 'Soft, "cotton"', '10.00', 'Apparel'])
+
+    def test_ndjson_export_is_gzipped_on_request(self):
+        self.client.force_login(self.admin)
+        response, body = self.export('orders', output='ndjson', compress='gzip')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="orders.ndjson.gz"')
+        (order,) = [json.loads(line) for line in gzip.decompress(body).decode().splitlines()]
+        self.assertEqual(order['id'], self.order.pk)
+        self.assertEqual(order['total_price'], '20.00')
+        self.assertEqual(order['shipping_details'], {'city': 'Lagos'})
+
+    def test_unknown_dataset_or_output_is_rejected(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self.export('customers')[0].status_code, 404)
+        self.assertEqual(self.export('products', output='xml')[0].status_code, 400)
+
+    def test_command_writes_a_file(self):
+        destination = os.path.join(tempfile.mkdtemp(), 'order-items.csv.gz')
+        self.addCleanup(shutil.rmtree, os.path.dirname(destination), ignore_errors=True)
+        call_command('export_data', 'order-items', '--file', destination, '--gzip', stderr=io.StringIO())
+        with gzip.open(destination, 'rt', newline='') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows, [
+            ['id', 'order_id', 'product_id', 'quantity', 'price'],
+            [str(self.order.items.get().pk), str(self.order.pk), str(self.shirt.pk), '2', '10.00'],
+        ])
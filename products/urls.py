@@ -24,6 +24,7 @@ urlpatterns = [
      path('products/<int:id>/', ProductDetailView.as_view(), name='product-detail'),
      path('create/', views.create_order, name='create_order'),
      path('cart/', views.CartView.as_view(), name='cart'),
+     path('export/<str:dataset>/', views.ExportView.as_view(), name='export'),
 
 
     
@@ -3,42 +3,153 @@ from rest_framework import viewsets, generics, status
 from rest_framework.decorators import api_view, action
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.contrib.auth.models import AnonymousUser
+from rest_framework.exceptions import NotFound
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+from django.http import StreamingHttpResponse
 import logging
-from .models import Product, Category, Order, OrderItem, Cart, CartItem
-from .serializers import ProductSerializer, CategorySerializer, OrderSerializer, CartSerializer
-from .pagination import ProductPagination
+from .models import Product, Category, Order, Cart, CartItem
+from .serializers import ProductSerializer, CategorySerializer, OrderSerializer, CartSerializer, CartOperationSerializer
+from .pagination import ProductPagination, ProductCursorPagination
+from .filters import filter_products, int_or_none, normalize_filters
+from .facets import get_facets
+from . import inventory
+from .checkout import OrderError, clean_lines, place_order
+from .idempotency import idempotent
+from .associations import RELATED_LIMIT, RELATED_MAX_LIMIT, related_products
+from .carts import AnonymousCart, CartOperationError, add_item, anonymous_carts_in_cache, apply_operations, get_cart, get_cart_summary
+from .category_tree import get_category_tree
+from .cache import get_product_details, set_product_details
+from .importers import FORMATS as IMPORT_FORMATS, ProductImporter, format_for, read_rows
+from .exporters import DATASETS as EXPORT_DATASETS, OUTPUTS as EXPORT_OUTPUTS, export_chunks, export_filename
+from .conditional import (
+    CachedProductDetailMixin, ConditionalProductListMixin, category_etag, not_modified, set_validators,
+)
 
 logger = logging.getLogger(__name__)
 
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all()
+class ProductPaginationMixin:
+    """Switch the catalog to keyset pagination when the client sends ``?cursor=``."""
+    cursor_pagination_class = ProductCursorPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.cursor_pagination_class.cursor_query_param in self.request.query_params:
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+class ProductFieldSelectionMixin:
+    """
+    Narrow product reads with ``?fields=``, ``?omit=`` or ``?view=card``.
+    The same selection shapes the serializer and the query, so fields
+    nobody asked for are neither fetched nor serialized.
+    """
+
+    def get_field_selection(self):
+        if self.request.method not in ('GET', 'HEAD'):
+            return {}
+        params = self.request.query_params
+        selection = {}
+        for name in ('fields', 'omit'):
+            if value := params.get(name):
+                selection[name] = [field.strip() for field in value.split(',') if field.strip()]
+        if params.get('view') == 'card':
+            selection['view'] = 'card'
+        return selection
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if columns := ProductSerializer.columns_for(**self.get_field_selection()):
+            queryset = queryset.only(*columns)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.update(self.get_field_selection())
+        return super().get_serializer(*args, **kwargs)
+
+class ProductViewSet(ProductPaginationMixin, ConditionalProductListMixin, CachedProductDetailMixin, ProductFieldSelectionMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.for_api()
     serializer_class = ProductSerializer
     pagination_class = ProductPagination
 
     def get_queryset(self):
         queryset = super().get_queryset()
-        
-        # Category filter
-        if category := self.request.query_params.get('category'):
-            category_ids = category.split(',')
-            queryset = queryset.filter(category__id__in=category_ids)
-        
-        # Price range filter
-        if min_price := self.request.query_params.get('min_price'):
-            queryset = queryset.filter(price__gte=min_price)
-        if max_price := self.request.query_params.get('max_price'):
-            queryset = queryset.filter(price__lte=max_price)
-        
-        # Search filter
-        if search := self.request.query_params.get('search'):
-            queryset = queryset.filter(name__icontains=search)
-        
-        # Ordering
-        if ordering := self.request.query_params.get('ordering'):
-            queryset = queryset.order_by(ordering)
-        
-        return queryset
+        return filter_products(queryset, self.request.query_params)
+
+    @action(
+        detail=False, methods=['post'], url_path='import',
+        permission_classes=[IsAdminUser], parser_classes=[MultiPartParser],
+    )
+    def import_products(self, request):
+        """Upsert products from an uploaded CSV or JSON Lines feed, streamed in batches."""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        fmt = request.data.get('format') or format_for(upload.name)
+        if fmt not in IMPORT_FORMATS:
+            return Response({'error': f'format must be one of {", ".join(IMPORT_FORMATS)}'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            batch_size = max(int(request.data.get('batch_size', 1000)), 1)
+        except ValueError:
+            return Response({'error': 'batch_size must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        importer = ProductImporter(batch_size=batch_size, dry_run=request.data.get('dry_run') in ('1', 'true'))
+        result = importer.run(read_rows(upload.file, fmt))
+        logger.info(f"Product import by {request.user}: {result.created} created, {result.updated} updated, {result.failed} failed")
+        return Response(result.as_dict())
+
+    @action(detail=False, methods=['get'], url_path='facets')
+    def facets(self, request):
+        """Category, price bucket and in-stock counts for the same filters the list takes."""
+        return Response(get_facets(self.get_queryset(), normalize_filters(request.query_params)))
+
+    @action(detail=True, methods=['get'], url_path='related')
+    def related(self, request, pk=None):
+        """Products most often bought together with this one, from the co-purchase index."""
+        product_id = int_or_none(pk)
+        if product_id is None:
+            raise NotFound()
+        limit = min(max(int_or_none(request.query_params.get('limit')) or RELATED_LIMIT, 1), RELATED_MAX_LIMIT)
+        products = related_products(product_id, limit)
+        return Response({'results': self.get_serializer(products, many=True).data})
+
+    @action(detail=False, methods=['get'], url_path='batch')
+    def batch(self, request):
+        """
+        Many products by id in one request, e.g. ``?ids=3,1,2``. Results keep
+        the requested order and ids that do not exist are listed under
+        ``missing``. Cached details are reused; the rest come from one query.
+        """
+        try:
+            ids = list(dict.fromkeys(int(value) for value in request.query_params.get('ids', '').split(',') if value.strip()))
+        except ValueError:
+            return Response({'error': 'ids must be a comma-separated list of integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if not ids:
+            return Response({'error': 'ids is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > settings.PRODUCT_BATCH_MAX_IDS:
+            return Response({'error': f'At most {settings.PRODUCT_BATCH_MAX_IDS} ids per request'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Only the full representation is cached; field selections are rendered directly
+        cacheable = not self.get_field_selection()
+        found = {pk: data for pk, (data, _) in get_product_details(ids).items()} if cacheable else {}
+        misses = [pk for pk in ids if pk not in found]
+        if misses:
+            # Unfiltered: listing parameters do not apply to an explicit id list
+            products = list(super().get_queryset().filter(pk__in=misses))
+            rendered = dict(zip((product.pk for product in products), self.get_serializer(products, many=True).data))
+            found.update(rendered)
+            if cacheable:
+                set_product_details({product.pk: (rendered[product.pk], product.updated_at) for product in products})
+
+        return Response({
+            'results': [found[pk] for pk in ids if pk in found],
+            'missing': [pk for pk in ids if pk not in found],
+        })
 
 class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all()
@@ -51,6 +162,29 @@ class CategoryViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(parent_id=parent_id)
         return queryset
 
+    # Reads are served from the per-worker category tree without touching the database
+    def list(self, request, *args, **kwargs):
+        etag = category_etag(request)
+        if (response := not_modified(request, etag)) is not None:
+            return response
+        tree = get_category_tree()
+        parent_id = request.query_params.get('parent', None)
+        if parent_id is None:
+            categories = tree.list()
+        else:
+            parent_id = int_or_none(parent_id)
+            categories = tree.list(parent_id=parent_id) if parent_id is not None else []
+        return set_validators(Response(categories), etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        etag = category_etag(request)
+        if (response := not_modified(request, etag)) is not None:
+            return response
+        representation = get_category_tree().get(int_or_none(kwargs.get(self.lookup_field)))
+        if representation is None:
+            raise NotFound()
+        return set_validators(Response(representation), etag)
+
 class OrderViewSet(viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
@@ -58,15 +192,42 @@ class OrderViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        
+        fields = dict(serializer.validated_data)
         # If user is authenticated, associate the order with the user
         if request.user.is_authenticated:
-            serializer.save(user=request.user)
-        else:
-            serializer.save()
+            fields['user'] = request.user
+
+        try:
+            order = place_order(clean_lines(request.data.get('items')), **fields)
+        except OrderError as e:
+            return Response({'items': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        except inventory.InsufficientStock as e:
+            return Response(e.as_dict(), status=status.HTTP_409_CONFLICT)
 
-        headers = self.get_success_headers(serializer.data)
-        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+        prefetch_related_objects([order], Order.items_prefetch())
+        data = self.get_serializer(order).data
+        headers = self.get_success_headers(data)
+        return Response(data, status=status.HTTP_201_CREATED, headers=headers)
+
+    def perform_update(self, serializer):
+        order = serializer.save()
+        if order.status == Order.CANCELLED:
+            inventory.release_order(order)
+
+    def perform_destroy(self, instance):
+        inventory.delete_order(instance)
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    def cancel(self, request, pk=None):
+        """Cancel the order and put its reserved stock back on sale; owner or staff only."""
+        orders = Order.objects.all() if request.user.is_staff else Order.objects.filter(user=request.user)
+        try:
+            order = orders.get(pk=pk)
+        except (Order.DoesNotExist, ValueError):
+            raise NotFound()
+        if order.status != Order.CANCELLED:
+            inventory.cancel_order(order)
+        return Response(self.get_serializer(order).data)
 
     def get_queryset(self):
         if self.request.user.is_authenticated:
@@ -74,31 +235,29 @@ class OrderViewSet(viewsets.ModelViewSet):
         return Order.objects.filter(email=self.request.query_params.get('email', ''))
 
 
+@idempotent('orders.create')
 @api_view(['POST'])
 def create_order(request):
     serializer = OrderSerializer(data=request.data)
     if serializer.is_valid():
-        order = serializer.save()
-        
-        # Create order items
-        items_data = request.data.get('items', [])
-        for item_data in items_data:
-            OrderItem.objects.create(
-                order=order,
-                product_id=item_data['product_id'],
-                quantity=item_data['quantity']
-            )
-        
+        fields = dict(serializer.validated_data)
+
         # Handle different payment methods
         payment_method = request.data.get('payment_method')
         if payment_method == 'cod':
-            order.status = 'Pending'  # or whatever status you use for COD orders
+            fields['status'] = 'Pending'  # or whatever status you use for COD orders
         elif payment_method == 'whatsapp':
-            order.status = 'Awaiting Payment'  # or whatever status you use for WhatsApp orders
-        
-        order.save()
+            fields['status'] = 'Awaiting Payment'  # or whatever status you use for WhatsApp orders
+
+        try:
+            order = place_order(clean_lines(request.data.get('items')), **fields)
+        except OrderError as e:
+            return Response({'items': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        except inventory.InsufficientStock as e:
+            return Response(e.as_dict(), status=status.HTTP_409_CONFLICT)
         
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        prefetch_related_objects([order], Order.items_prefetch())
+        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class CategoryDetail(generics.RetrieveAPIView):
@@ -107,10 +266,14 @@ class CategoryDetail(generics.RetrieveAPIView):
 
     def retrieve(self, request, *args, **kwargs):
         try:
-            instance = self.get_object()
-            serializer = self.get_serializer(instance)
-            logger.info(f"Retrieved category: {instance.id}")
-            return Response(serializer.data)
+            etag = category_etag(request)
+            if (response := not_modified(request, etag)) is not None:
+                return response
+            representation = get_category_tree().get(int_or_none(kwargs.get('pk')))
+            if representation is None:
+                raise Category.DoesNotExist
+            logger.info(f"Retrieved category: {representation['id']}")
+            return set_validators(Response(representation), etag)
         except Category.DoesNotExist:
             logger.error(f"Category not found for ID: {kwargs.get('pk')}")
             return Response(
@@ -130,52 +293,58 @@ class CartViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return Cart.objects.filter(user=self.request.user)
-        return Cart.objects.filter(session_id=self.request.session.session_key)
+            return Cart.objects.filter(user=self.request.user).with_items()
+        return Cart.objects.filter(session_id=self.request.session.session_key).with_items()
 
     def get_object(self):
-        cart = None
-        if self.request.user.is_authenticated:
-            cart, _ = Cart.objects.get_or_create(user=self.request.user)
-        else:
-            session_id = self.request.session.session_key
-            if not session_id:
-                self.request.session.create()
-                session_id = self.request.session.session_key
-            cart, _ = Cart.objects.get_or_create(session_id=session_id)
-        return cart
+        return get_cart(self.request)
     
     @action(detail=False, methods=['get'])
     def view_cart(self, request):
         cart = self.get_object()
-        serializer = self.get_serializer(cart)
+        serializer = self.get_serializer(cart.load_items())
         return Response(serializer.data)
 
     @action(detail=False, methods=['post'])
     def add_to_cart(self, request):
         cart = self.get_object()
-        product_id = request.data.get('product_id')
+        product_id = int_or_none(request.data.get('product_id'))
         quantity = int(request.data.get('quantity', 1))
+        if quantity <= 0:
+            return Response({'error': 'quantity must be positive'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            product = Product.objects.get(id=product_id)
+            add_item(cart, product_id, quantity)
         except Product.DoesNotExist:
             return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
-
-        if product.stock < quantity:
+        except inventory.InsufficientStock:
             return Response({'error': 'Not enough stock'}, status=status.HTTP_400_BAD_REQUEST)
 
-        cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-        if not created:
-            cart_item.quantity += quantity
-        else:
-            cart_item.quantity = quantity
-        cart_item.save()
-
-        serializer = self.get_serializer(cart)
-        return Response(serializer.data)
+        response = Response(self.get_serializer(cart.load_items()).data)
+        return cart.save(response) if isinstance(cart, AnonymousCart) else response
     
 
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """Item count and total only, for header badges; cached per cart."""
+        return Response(get_cart_summary(request))
+
+    @action(detail=False, methods=['post'], url_path='batch')
+    def batch(self, request):
+        """
+        Apply a list of ``{"op": "add"|"set"|"remove", "product_id", "quantity"}``
+        operations in order, all or nothing, and return the resulting cart.
+        """
+        operations = CartOperationSerializer(data=request.data.get('operations'), many=True, max_length=settings.CART_BATCH_MAX_OPERATIONS, allow_empty=False)
+        operations.is_valid(raise_exception=True)
+        cart = self.get_object()
+        try:
+            cart = apply_operations(cart, operations.validated_data)
+        except CartOperationError as e:
+            return Response({'errors': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        response = Response(self.get_serializer(cart).data)
+        return cart.save(response) if isinstance(cart, AnonymousCart) else response
   
     @action(detail=False, methods=['put'])
     def update_quantity(self, request):
@@ -183,6 +352,12 @@ class CartViewSet(viewsets.ModelViewSet):
         item_id = request.data.get('item_id')
         quantity = int(request.data.get('quantity', 0))
 
+        if not request.user.is_authenticated and anonymous_carts_in_cache():
+            cart = AnonymousCart.from_request(request)
+            if not cart.set_quantity(int_or_none(item_id), quantity):
+                return Response({'error': 'Cart item not found'}, status=status.HTTP_404_NOT_FOUND)
+            return cart.save(Response(self.get_serializer(cart).data))
+
         try:
             cart_item = CartItem.objects.get(id=item_id)
             
@@ -195,7 +370,7 @@ class CartViewSet(viewsets.ModelViewSet):
 
             cart = cart_item.cart
             cart.refresh_from_db()
-            serializer = self.get_serializer(cart)
+            serializer = self.get_serializer(cart.load_items())
             return Response(serializer.data)
         except CartItem.DoesNotExist:
             return Response({'error': 'Cart item not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -236,7 +411,7 @@ def remove_from_cart(self, request):
                     current_cart_item.delete()
                     print(f"Equivalent item deleted successfully")
                     cart.refresh_from_db()
-                    serializer = self.get_serializer(cart)
+                    serializer = self.get_serializer(cart.load_items())
                     return Response(serializer.data)
                 except CartItem.DoesNotExist:
                     return Response({'error': 'Item not found in your cart'}, status=status.HTTP_404_NOT_FOUND)
@@ -246,7 +421,7 @@ def remove_from_cart(self, request):
                 item.delete()
                 print(f"Item deleted successfully")
                 cart.refresh_from_db()
-                serializer = self.get_serializer(cart)
+                serializer = self.get_serializer(cart.load_items())
                 return Response(serializer.data)
         else:
             print(f"Item {item_id} does not exist in any cart")
@@ -255,53 +430,27 @@ def remove_from_cart(self, request):
     except Exception as e:
         print(f"Unexpected error: {str(e)}")
         return Response({'error': f'An unexpected error occurred: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-class ProductList(generics.ListAPIView):
+class ProductList(ProductPaginationMixin, ConditionalProductListMixin, ProductFieldSelectionMixin, generics.ListAPIView):
+    queryset = Product.objects.for_api()
     serializer_class = ProductSerializer
     pagination_class = ProductPagination
 
     def get_queryset(self):
-        queryset = Product.objects.all()
-        
-        # Category filter
-        if category := self.request.query_params.get('category'):
-            category_ids = category.split(',')
-            queryset = queryset.filter(category__id__in=category_ids)
-        
-        # Price range filter
-        if min_price := self.request.query_params.get('min_price'):
-            queryset = queryset.filter(price__gte=min_price)
-        if max_price := self.request.query_params.get('max_price'):
-            queryset = queryset.filter(price__lte=max_price)
-        
-        # Search filter
-        if search := self.request.query_params.get('search'):
-            queryset = queryset.filter(name__icontains=search)
-        
-        # Ordering
-        if ordering := self.request.query_params.get('ordering'):
-            queryset = queryset.order_by(ordering)
-        
-        return queryset
+        return filter_products(super().get_queryset(), self.request.query_params)
 
     
-class ProductDetailView(generics.RetrieveAPIView):
-    queryset = Product.objects.all()
+class ProductDetailView(CachedProductDetailMixin, ProductFieldSelectionMixin, generics.RetrieveAPIView):
+    queryset = Product.objects.for_api()
     serializer_class = ProductSerializer
     lookup_field = 'id'
 
 class CartView(APIView):
     def get_or_create_cart(self, request):
-        if not isinstance(request.user, AnonymousUser):
-            cart, created = Cart.objects.get_or_create(user=request.user)
-        else:
-            if not request.session.session_key:
-                request.session.create()
-            cart, created = Cart.objects.get_or_create(session_id=request.session.session_key)
-        return cart
+        return get_cart(request)
 
     def get(self, request):
         cart = self.get_or_create_cart(request)
-        serializer = CartSerializer(cart)
+        serializer = CartSerializer(cart.load_items())
         return Response(serializer.data)
     
     def post(self, request):
@@ -318,35 +467,34 @@ class CartView(APIView):
             return Response({"error": "Invalid action"}, status=status.HTTP_400_BAD_REQUEST)
     
     def add_to_cart(self, request, cart):
-        product_id = request.data.get('product_id')
+        product_id = int_or_none(request.data.get('product_id'))
         quantity = int(request.data.get('quantity', 1))
+        if quantity <= 0:
+            return Response({'error': 'quantity must be positive'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            product = Product.objects.get(id=product_id)
+            add_item(cart, product_id, quantity)
         except Product.DoesNotExist:
             return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
-        
-        if product.stock < quantity:
+        except inventory.InsufficientStock:
             return Response({'error': 'Not enough stock'}, status=status.HTTP_400_BAD_REQUEST)
         
-        cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-        if not created:
-            cart_item.quantity += quantity
-        else:
-            cart_item.quantity = quantity
-        cart_item.save()
-        
-        serializer = CartSerializer(cart)
-        return Response(serializer.data)
+        response = Response(CartSerializer(cart.load_items()).data)
+        return cart.save(response) if isinstance(cart, AnonymousCart) else response
     
     def remove_from_cart(self, request, cart):
         item_id = request.data.get('item_id')
+
+        if isinstance(cart, AnonymousCart):
+            if not cart.set_quantity(int_or_none(item_id), 0):
+                return Response({'error': 'Item not found in cart'}, status=status.HTTP_404_NOT_FOUND)
+            return cart.save(Response(CartSerializer(cart).data))
         
         try:
             item = CartItem.objects.get(id=item_id, cart=cart)
             item.delete()
             cart.refresh_from_db()
-            serializer = CartSerializer(cart)
+            serializer = CartSerializer(cart.load_items())
             return Response(serializer.data)
         except CartItem.DoesNotExist:
             return Response({'error': 'Item not found in cart'}, status=status.HTTP_404_NOT_FOUND)
@@ -354,6 +502,11 @@ class CartView(APIView):
     def update_quantity(self, request, cart):
         item_id = request.data.get('item_id')
         quantity = int(request.data.get('quantity', 0))
+
+        if isinstance(cart, AnonymousCart):
+            if not cart.set_quantity(int_or_none(item_id), quantity):
+                return Response({'error': 'Cart item not found'}, status=status.HTTP_404_NOT_FOUND)
+            return cart.save(Response(CartSerializer(cart).data))
         
         try:
             cart_item = CartItem.objects.get(id=item_id, cart=cart)
@@ -366,7 +519,34 @@ class CartView(APIView):
                 cart_item.delete()
             
             cart.refresh_from_db()
-            serializer = CartSerializer(cart)
+            serializer = CartSerializer(cart.load_items())
             return Response(serializer.data)
         except CartItem.DoesNotExist:
             return Response({'error': 'Cart item not found'}, status=status.HTTP_404_NOT_FOUND)
+
+
+class ExportView(APIView):
+    """
+    Stream a full export of products, orders or order items.
+
+    ``?output=csv|ndjson`` picks the encoding and ``?compress=gzip``
+    compresses the stream.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, dataset):
+        if dataset not in EXPORT_DATASETS:
+            return Response({'error': 'Unknown export'}, status=status.HTTP_404_NOT_FOUND)
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_OUTPUTS:
+            return Response({'error': f'output must be one of {", ".join(EXPORT_OUTPUTS)}'}, status=status.HTTP_400_BAD_REQUEST)
+        compress = request.query_params.get('compress') == 'gzip'
+
+        logger.info(f"Export of {dataset} as {output} by {request.user}")
+        # A gzip download is a .gz file, not a transfer encoding clients should undo
+        response = StreamingHttpResponse(
+            export_chunks(dataset, output=output, compress=compress),
+            content_type='application/gzip' if compress else EXPORT_OUTPUTS[output],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{export_filename(dataset, output, compress)}"'
+        return response